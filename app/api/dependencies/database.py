@@ -1,15 +1,37 @@
 from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.session import async_session
+from db.replica import get_read_session_maker
+from db.session import async_session, record_session_usage
 
 
 async def get_db_session() -> AsyncSession:
     """
-    Dependency function that yields db sessions
+    Dependency function that yields db sessions; a connection is only
+    checked out from the pool when the first statement is executed, so
+    requests rejected before touching the db do not hold one
     """
     async with async_session() as session:
-        yield session
+        try:
+            yield session
+        finally:
+            record_session_usage(session)
 
 
 DbSessionDep = Annotated[AsyncSession, Depends(get_db_session)]
+
+
+async def get_read_only_db_session() -> AsyncSession:
+    """
+    Dependency function that yields sessions of the read replica, falling
+    back to the primary; for routes which only read
+    """
+    session_maker = await get_read_session_maker()
+    async with session_maker() as session:
+        try:
+            yield session
+        finally:
+            record_session_usage(session)
+
+
+ReadOnlyDbSessionDep = Annotated[AsyncSession, Depends(get_read_only_db_session)]
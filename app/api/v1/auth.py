@@ -8,6 +8,8 @@ from services.users import (
     authenticate_user,
     create_access_token,
     get_current_active_user,
+    get_identity_claims,
+    to_user_schema,
     refresh_access_token,
 )
 from api.dependencies.database import DbSessionDep
@@ -27,7 +29,9 @@ async def login_for_access_token(
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token, refresh_token = create_access_token(data={"sub": user.username})
+    access_token, refresh_token = create_access_token(
+        data=get_identity_claims(to_user_schema(user))
+    )
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -38,9 +42,10 @@ async def login_for_access_token(
 @router.post("/auth/token/refresh", tags=["auth"])
 async def post_refresh_access_token(
     token: RefreshToken,
+    db_session: DbSessionDep,
 ):
-    access_token, refresh_token = refresh_access_token(
-        refresh_token=token.refresh_token
+    access_token, refresh_token = await refresh_access_token(
+        db_session, refresh_token=token.refresh_token
     )
     return {
         "access_token": access_token,
@@ -1,69 +1,364 @@
-from jose import jwt, JWTError  # noqa
-from fastapi import APIRouter, HTTPException, status as http_status
-from loguru import logger
-from pydantic import ValidationError
+from datetime import datetime, timedelta
+from typing import Annotated
 
-from api.dependencies.database import DbSessionDep
+from fastapi import APIRouter, Depends, HTTPException, Query, status as http_status
+from fastapi import Header, Request, Response
+from fastapi.responses import StreamingResponse
+
+from core.config import settings
+from core.metrics import observe_stage
+from core.responses import PydanticJSONResponse
+
+from api.dependencies.database import DbSessionDep, ReadOnlyDbSessionDep
 from db.cruds.devices import DevicesCrud
-from db.cruds.measurements import MeasurementsCrud
+from db.cruds.measurements import MeasurementsCrud, align_to_buckets
+from db.cruds.rollups import MeasurementRollupsCrud
+from db.models.devices import Measurements as MeasurementsTable
+from schemas.base import TotalCountModeEnum
 from schemas.measurements import (
-    MeasurementItemSchema,
-    MeasurementCreateSchema,
-    MeasurementDecodedSchema,
+    MeasurementIngestedSchema,
+    CursorPaginatedMeasurementListSchema,
+    MeasurementAggregateListSchema,
+    MeasurementBucketEnum,
+    LatestMeasurementListSchema,
     MeasurementEncodedPayload,
+    MeasurementBatchEncodedPayload,
+    MeasurementBatchItemResultSchema,
+    MeasurementBatchItemStatusEnum,
+    MeasurementBatchResultSchema,
+    MeasurementUploadFormatEnum,
+    MeasurementUploadResultSchema,
 )
 from schemas.devices import DeviceCreateSchema, DeviceSchema
-from core.config import settings
+from services.ingestion_buffer import measurements_buffer
+from services.latest_measurements import etag_matches, latest_measurements_snapshot
+from services.measurements_export import (
+    MeasurementExportFormatEnum,
+    iter_measurements_export,
+)
+from services.measurements_upload import upload_measurements
+from services.users import verify_token
+from services.measurements import (
+    decode_measurement_payload,
+    payload_digest,
+    get_ingested_measurement,
+    remember_ingested_measurement,
+    count_duplicate_measurement,
+    to_measurement_create_schema,
+    to_naive_utc,
+    store_measurements,
+    update_latest_snapshot,
+)
 
 router = APIRouter(tags=["Devices"])
 
 
-@router.post("/measurements", response_model=MeasurementItemSchema)
+@router.post("/measurements", response_model=MeasurementIngestedSchema)
 async def post_measurement(
     measurement: MeasurementEncodedPayload,
     db_session: DbSessionDep,
 ):
+    digest = payload_digest(measurement.data)
+    if (measurement_ := get_ingested_measurement(digest)) is not None:
+        return measurement_
+
     devices_crud = DevicesCrud(db_session)
     measurements_crud = MeasurementsCrud(db_session)
 
-    data_payload = measurement.data
-    try:
-        data = MeasurementDecodedSchema.model_validate(
-            jwt.decode(
-                data_payload,
-                settings.DEVICE_DATA_SECRET_KEY,
+    with observe_stage("jwt_decode"):
+        data = decode_measurement_payload(measurement.data, digest)
+    with observe_stage("device_lookup"):
+        device: DeviceSchema = await devices_crud.get_or_create_by_uid(
+            DeviceCreateSchema(
+                uid=data.device_id,
+                sensor_type=data.sensor_type,
+            ),
+            use_cache=True,
+        )
+    in_schema = to_measurement_create_schema(data, device)
+    if settings.MEASUREMENTS_WRITE_BEHIND:
+        # device may have just been registered, it must exist before the flush
+        with observe_stage("commit"):
+            await devices_crud.commit_session()
+        with observe_stage("enqueue"):
+            measurement_ = measurements_buffer.put(in_schema, digest)
+    else:
+        with observe_stage("insert"):
+            (measurement_,) = await store_measurements(db_session, [in_schema])
+        with observe_stage("commit"):
+            await measurements_crud.commit_session()
+        update_latest_snapshot([measurement_])
+        remember_ingested_measurement(digest, measurement_)
+    return measurement_
+
+
+@router.post("/measurements/batch", response_model=MeasurementBatchResultSchema)
+async def post_measurements_batch(
+    measurements: MeasurementBatchEncodedPayload,
+    db_session: DbSessionDep,
+):
+    devices_crud = DevicesCrud(db_session)
+    measurements_crud = MeasurementsCrud(db_session)
+
+    results: list[MeasurementBatchItemResultSchema | None] = [None] * len(
+        measurements.data
+    )
+    digests = [payload_digest(data_payload) for data_payload in measurements.data]
+    # index of the first occurrence of every payload not ingested before
+    first_indexes: dict[str, int] = {}
+    decoded = {}
+    for index, (data_payload, digest) in enumerate(zip(measurements.data, digests)):
+        if (measurement_ := get_ingested_measurement(digest)) is not None:
+            results[index] = MeasurementBatchItemResultSchema(
+                index=index,
+                status=MeasurementBatchItemStatusEnum.DUPLICATE,
+                measurement=measurement_,
+            )
+            continue
+        if digest in first_indexes:
+            continue
+        first_indexes[digest] = index
+        try:
+            decoded[index] = decode_measurement_payload(data_payload, digest)
+        except HTTPException as e:
+            results[index] = MeasurementBatchItemResultSchema(
+                index=index,
+                status=MeasurementBatchItemStatusEnum.REJECTED,
+                detail=e.detail,
+            )
+
+    devices = await devices_crud.get_or_create_many_by_uids(
+        [
+            DeviceCreateSchema(uid=data.device_id, sensor_type=data.sensor_type)
+            for data in decoded.values()
+        ],
+        use_cache=True,
+    )
+    for index, data in list(decoded.items()):
+        if data.device_id not in devices:
+            del decoded[index]
+            results[index] = MeasurementBatchItemResultSchema(
+                index=index,
+                status=MeasurementBatchItemStatusEnum.REJECTED,
+                detail="Device is deleted",
+            )
+
+    in_schemas = {
+        index: to_measurement_create_schema(data, devices[data.device_id])
+        for index, data in decoded.items()
+    }
+    created = {}
+    if settings.MEASUREMENTS_WRITE_BEHIND:
+        await devices_crud.commit_session()
+        for index, in_schema in in_schemas.items():
+            try:
+                created[index] = measurements_buffer.put(in_schema, digests[index])
+            except HTTPException as e:
+                results[index] = MeasurementBatchItemResultSchema(
+                    index=index,
+                    status=MeasurementBatchItemStatusEnum.REJECTED,
+                    detail=e.detail,
+                )
+    else:
+        created = dict(
+            zip(
+                in_schemas.keys(),
+                await store_measurements(db_session, list(in_schemas.values())),
+            )
+        )
+        await measurements_crud.commit_session()
+        update_latest_snapshot(list(created.values()))
+        for index, measurement_ in created.items():
+            remember_ingested_measurement(digests[index], measurement_)
+
+    for index, measurement_ in created.items():
+        results[index] = MeasurementBatchItemResultSchema(
+            index=index,
+            status=(
+                MeasurementBatchItemStatusEnum.DUPLICATE
+                if measurement_.duplicate
+                else MeasurementBatchItemStatusEnum.CREATED
+            ),
+            measurement=measurement_,
+        )
+    # repeated payloads within the batch share the result of the first one
+    for index, digest in enumerate(digests):
+        if results[index] is not None:
+            continue
+        first_result = results[first_indexes[digest]]
+        if first_result.measurement is not None:
+            count_duplicate_measurement(first_result.measurement)
+            results[index] = MeasurementBatchItemResultSchema(
+                index=index,
+                status=MeasurementBatchItemStatusEnum.DUPLICATE,
+                measurement=first_result.measurement.model_copy(
+                    update={"duplicate": True}
+                ),
             )
+        else:
+            results[index] = first_result.model_copy(update={"index": index})
+
+    rejected = sum(
+        result.status == MeasurementBatchItemStatusEnum.REJECTED for result in results
+    )
+    return PydanticJSONResponse(
+        MeasurementBatchResultSchema(
+            accepted=len(results) - rejected,
+            rejected=rejected,
+            items=results,
         )
-    except JWTError as e:
-        logger.exception(e)
+    )
+
+
+@router.post("/measurements/upload", response_model=MeasurementUploadResultSchema)
+async def post_measurements_upload(
+    request: Request,
+    db_session: DbSessionDep,
+    x_signature: Annotated[str, Header()],
+    upload_format: Annotated[
+        MeasurementUploadFormatEnum, Query(alias="format")
+    ] = MeasurementUploadFormatEnum.NDJSON,
+    content_encoding: Annotated[str | None, Header()] = None,
+):
+    """
+    Bulk upload of plain MeasurementDecodedSchema records as NDJSON or CSV
+    with a header line, optionally gzip encoded. X-Signature is the hex
+    HMAC-SHA256 of the body as sent, keyed with the device data secret.
+    The body is streamed to the db in batches; malformed records are
+    rejected and reported, the rest is stored unless the signature fails.
+    """
+    return await upload_measurements(
+        db_session,
+        request.stream(),
+        upload_format,
+        x_signature,
+        gzipped=content_encoding == "gzip",
+    )
+
+
+@router.get(
+    "/{uid}/measurements",
+    response_model=CursorPaginatedMeasurementListSchema,
+    dependencies=[Depends(verify_token)],
+)
+async def get_device_measurements(
+    uid: str,
+    db_session: ReadOnlyDbSessionDep,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    cursor: str | None = None,
+    total: TotalCountModeEnum = TotalCountModeEnum.NONE,
+):
+    """
+    Device measurements, newest first. Pass next_cursor of the response
+    as cursor to get the following page.
+    """
+    device = await DevicesCrud(db_session).get_device_by_uid(uid, use_cache=True)
+    measurements = await MeasurementsCrud(db_session).get_cursor_paginated_list(
+        limit=limit,
+        cursor=cursor,
+        filter_statement=MeasurementsTable.device_id == device.id,
+        total_count_mode=total,
+    )
+    return PydanticJSONResponse(measurements)
+
+
+@router.get(
+    "/{uid}/measurements/aggregates",
+    response_model=MeasurementAggregateListSchema,
+    dependencies=[Depends(verify_token)],
+)
+async def get_device_measurements_aggregates(
+    uid: str,
+    db_session: ReadOnlyDbSessionDep,
+    bucket: MeasurementBucketEnum = MeasurementBucketEnum.HOUR,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """
+    min/avg/max of the device measurements per time bucket in [start, end).
+    Defaults to the last 24 hours; timestamps are UTC. The range is widened
+    to whole buckets, the response has the aligned start and end.
+    """
+    end = to_naive_utc(end) if end else datetime.utcnow()
+    start = to_naive_utc(start) if start else end - timedelta(days=1)
+    # raw and rollup reads then count the same readings in the edge buckets
+    start, end = align_to_buckets(start, end, bucket)
+    if start >= end:
         raise HTTPException(
-            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Could not decode JWT",
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end",
         )
-    except ValidationError as e:
-        logger.exception(e)
-        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e))
-    try:
-        device: DeviceSchema = await devices_crud.get_device_by_uid(
-            uid=data.device_id,
+    if (end - start) / bucket.interval > settings.MEASUREMENTS_AGGREGATE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="Too many buckets requested, use a bigger bucket or shorter range",
         )
-    except HTTPException as e:
-        logger.info(f"Device with id: {data.device_id} not found, creating.")
-        device: DeviceSchema = await devices_crud.create(
-            DeviceCreateSchema(
-                uid=data.device_id,
-                sensor_type=data.sensor_type,
-            )
+    device = await DevicesCrud(db_session).get_device_by_uid(uid, use_cache=True)
+    if MeasurementRollupsCrud.get_rollup(bucket) is not None:
+        items = await MeasurementRollupsCrud(db_session).get_aggregated_list(
+            device_id=device.id, start=start, end=end, bucket=bucket
         )
-        await devices_crud.commit_session()
-    measurement_ = await measurements_crud.create(
-        in_schema=MeasurementCreateSchema(
-            device_id=device.id,
-            time_=data.time.replace(tzinfo=None),
-            pm2_5=data.pm2_5,
-            pm10=data.pm10,
-            pm1=data.pm1,
+    else:
+        items = await MeasurementsCrud(db_session).get_aggregated_list(
+            device_id=device.id, start=start, end=end, bucket=bucket
+        )
+    return PydanticJSONResponse(
+        MeasurementAggregateListSchema(
+            device_id=device.id, bucket=bucket, start=start, end=end, items=items
         )
     )
-    await measurements_crud.commit_session()
-    return measurement_
+
+
+@router.get("/measurements/latest", response_model=LatestMeasurementListSchema)
+async def get_latest_measurements(
+    db_session: ReadOnlyDbSessionDep,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Latest measurement of every active device. Supports If-None-Match,
+    unchanged snapshot is answered with 304 and no body.
+    """
+    body, etag = await latest_measurements_snapshot.get(db_session)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=http_status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/measurements/export", dependencies=[Depends(verify_token)])
+async def export_measurements(
+    db_session: ReadOnlyDbSessionDep,
+    start: datetime,
+    end: datetime | None = None,
+    device: Annotated[list[str] | None, Query()] = None,
+    export_format: Annotated[
+        MeasurementExportFormatEnum, Query(alias="format")
+    ] = MeasurementExportFormatEnum.CSV,
+    fetch_size: Annotated[int, Query(ge=100, le=100000)] = (
+        settings.MEASUREMENTS_EXPORT_FETCH_SIZE
+    ),
+):
+    """
+    Streams raw measurements in [start, end) ordered by time as csv, ndjson,
+    Arrow IPC stream or Parquet. Optionally limited to the given device uids.
+    """
+    start = to_naive_utc(start)
+    end = to_naive_utc(end) if end else datetime.utcnow()
+    device_ids = None
+    if device:
+        devices = await DevicesCrud(db_session).get_devices_by_uids(
+            device, use_cache=True
+        )
+        if missing := set(device) - devices.keys():
+            raise HTTPException(
+                status_code=http_status.HTTP_404_NOT_FOUND,
+                detail=f"Devices not found: {', '.join(sorted(missing))}",
+            )
+        device_ids = [i.id for i in devices.values()]
+
+    filename = f"measurements.{export_format.value}"
+    return StreamingResponse(
+        iter_measurements_export(export_format, start, end, device_ids, fetch_size),
+        media_type=export_format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
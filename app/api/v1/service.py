@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, status as http_status
+
+from api.dependencies.docs_security import basic_http_credentials
+from core.config import settings, EnvironmentEnum
+from db.cruds.devices import devices_cache
+from db.profiling import recent_query_profiles
+from db.replica import read_replica_state
+from db.session import get_pool_stats
+from services.hash_password import password_hashing_limiter
+from services.ingestion_buffer import measurements_buffer
+from services.measurements import (
+    decoded_payloads_cache,
+    ingested_payloads_cache,
+    duplicate_measurements,
+)
+
+router = APIRouter(tags=["Service"], dependencies=[Depends(basic_http_credentials)])
+
+
+@router.get("/stats")
+async def get_service_stats():
+    """
+    In-process runtime counters of the worker which served the request
+    """
+    return {
+        "db_pool": get_pool_stats(),
+        "read_replica": read_replica_state.stats(),
+        "devices_cache": devices_cache.stats(),
+        "measurements_write_behind": measurements_buffer.stats(),
+        "decoded_payloads_cache": decoded_payloads_cache.stats(),
+        "ingested_payloads_cache": ingested_payloads_cache.stats(),
+        "duplicate_measurements": {
+            "total": duplicate_measurements.total(),
+            "by_device": dict(duplicate_measurements),
+        },
+        "password_hashing": {
+            "threads": password_hashing_limiter.total_tokens,
+            "busy": password_hashing_limiter.borrowed_tokens,
+            "waiting": password_hashing_limiter.statistics().tasks_waiting,
+        },
+    }
+
+
+@router.get("/query-profiles")
+async def get_query_profiles():
+    """
+    Statements of the latest requests of this worker, newest first;
+    develop mode with DB_QUERY_PROFILING only
+    """
+    if settings.ENVIRONMENT != EnvironmentEnum.DEVELOP:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND)
+    return [profile.as_dict() for profile in reversed(recent_query_profiles)]
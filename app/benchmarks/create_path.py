@@ -0,0 +1,120 @@
+"""
+Per-row latency of inserting measurements through the ORM unit of work
+(session.add + flush + model_validate), BaseCrud.create (Core INSERT ...
+RETURNING) and BaseCrud.create_many. Everything runs in one transaction which
+is rolled back at the end, so it leaves no rows behind.
+
+Usage: python -m benchmarks.create_path [--rows N] [--batch-size N]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.cruds.measurements import MeasurementsCrud
+from db.models.devices import Devices, Measurements
+from db.session import async_session
+from schemas.measurements import MeasurementCreateSchema, MeasurementItemSchema
+
+
+def generate_measurements(rows: int, device_id: uuid.UUID) -> list:
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    return [
+        MeasurementCreateSchema(
+            device_id=device_id,
+            time_=start + timedelta(seconds=i),
+            pm1=round(random.uniform(0, 50), 1),
+            pm2_5=round(random.uniform(0, 80), 1),
+            pm10=round(random.uniform(0, 120), 1),
+            humidity=round(random.uniform(20, 90), 1),
+            temperature=round(random.uniform(-10, 35), 1),
+            noise=round(random.uniform(30, 90), 1),
+        )
+        for i in range(rows)
+    ]
+
+
+async def orm_create(
+    session: AsyncSession, in_schema: MeasurementCreateSchema
+) -> MeasurementItemSchema:
+    # BaseCrud.create before the Core fast path
+    entry = Measurements(**in_schema.model_dump())
+    session.add(entry)
+    await session.flush()
+    return MeasurementItemSchema.model_validate(entry)
+
+
+async def time_per_row(
+    rows: list, batch_size: int, insert: Callable[[list], Awaitable]
+) -> list[float]:
+    latencies = []
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset : offset + batch_size]
+        started = time.perf_counter()
+        await insert(batch)
+        latencies.append((time.perf_counter() - started) * 1e6 / len(batch))
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+    p99 = quantiles[98] if quantiles else latencies[0]
+    print(
+        f"{name:>12}: {statistics.mean(latencies):8.1f} us/row mean "
+        f"{statistics.median(latencies):8.1f} median {p99:8.1f} p99"
+    )
+
+
+async def run(rows: int, batch_size: int) -> None:
+    async with async_session() as session:
+        device = Devices(uid=f"benchmark-{uuid.uuid4()}")
+        session.add(device)
+        await session.flush()
+        crud = MeasurementsCrud(session)
+
+        async def orm(batch):
+            for in_schema in batch:
+                await orm_create(session, in_schema)
+            # keeps the identity map from growing across batches
+            session.expunge_all()
+
+        async def core(batch):
+            for in_schema in batch:
+                await crud.create(in_schema)
+
+        async def core_many(batch):
+            await crud.create_many(batch)
+
+        try:
+            for name, insert, size in (
+                ("orm", orm, 1),
+                ("create", core, 1),
+                ("create_many", core_many, batch_size),
+            ):
+                latencies = await time_per_row(
+                    generate_measurements(rows, device.id), size, insert
+                )
+                report(name, latencies)
+        finally:
+            await session.rollback()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Concurrency check of device registration: --tasks tasks, each with its own
+session and transaction, register the same new uid at once through
+DevicesCrud.get_or_create_by_uid. Passes when every task gets the same device
+and exactly one row of the uid exists; the device is deleted afterwards.
+Needs Postgres, e.g. docker compose up -d airq_app_db.
+
+Usage: python -m benchmarks.device_registration [--tasks N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import uuid
+
+from sqlalchemy import delete, func, select
+
+from db.cruds.devices import DevicesCrud
+from db.models.devices import Devices
+from db.session import async_session, engine
+from schemas.devices import DeviceCreateSchema
+
+
+async def register(uid: str, start: asyncio.Event) -> uuid.UUID:
+    async with async_session() as session:
+        await start.wait()
+        device = await DevicesCrud(session).get_or_create_by_uid(
+            DeviceCreateSchema(uid=uid, sensor_type="benchmark")
+        )
+        await session.commit()
+        return device.id
+
+
+async def check_round(uid: str, tasks: int) -> bool:
+    start = asyncio.Event()
+    registrations = [asyncio.create_task(register(uid, start)) for _ in range(tasks)]
+    # let all tasks open their sessions before any registers
+    await asyncio.sleep(0)
+    start.set()
+    results = await asyncio.gather(*registrations, return_exceptions=True)
+
+    async with async_session() as session:
+        rows = await session.scalar(
+            select(func.count()).select_from(Devices).where(Devices.uid == uid)
+        )
+        await session.execute(delete(Devices).where(Devices.uid == uid))
+        await session.commit()
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    device_ids = {result for result in results if isinstance(result, uuid.UUID)}
+    passed = not errors and len(device_ids) == 1 and rows == 1
+    print(
+        f"{uid}: {tasks} registrations, {len(device_ids)} distinct ids, "
+        f"{rows} rows, {len(errors)} errors {errors[:1]} - "
+        + ("ok" if passed else "FAILED")
+    )
+    return passed
+
+
+async def run(tasks: int, rounds: int) -> bool:
+    passed = True
+    for _ in range(rounds):
+        passed &= await check_round(f"bench-registration-{uuid.uuid4().hex}", tasks)
+    await engine.dispose()
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    raise SystemExit(0 if asyncio.run(run(args.tasks, args.rounds)) else 1)
+
+
+if __name__ == "__main__":
+    main()
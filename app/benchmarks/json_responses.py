@@ -0,0 +1,117 @@
+"""
+Time to turn an already validated PaginatedMeasurementListSchema into a
+response body: FastAPI's response_model path (re-validation, then rendering
+with the stdlib json encoder or orjson) against PydanticJSONResponse rendering
+the model dump with orjson directly. Needs no database.
+
+Usage: python -m benchmarks.json_responses [--items N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+import orjson
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from core.responses import PydanticJSONResponse
+from schemas.measurements import MeasurementItemSchema, PaginatedMeasurementListSchema
+
+
+def generate_page(items: int) -> PaginatedMeasurementListSchema:
+    device_id = uuid.uuid4()
+    start = datetime.utcnow() - timedelta(seconds=items)
+    return PaginatedMeasurementListSchema(
+        total=items,
+        items=[
+            MeasurementItemSchema(
+                id=uuid.uuid4(),
+                device_id=device_id,
+                time_=start + timedelta(seconds=i),
+                pm1=round(random.uniform(0, 50), 1),
+                pm2_5=round(random.uniform(0, 80), 1),
+                pm10=round(random.uniform(0, 120), 1),
+                humidity=round(random.uniform(20, 90), 1),
+                temperature=round(random.uniform(-10, 35), 1),
+                noise=round(random.uniform(30, 90), 1),
+            )
+            for i in range(items)
+        ],
+    )
+
+
+def response_model_path(
+    response_class: type[JSONResponse], page: PaginatedMeasurementListSchema
+) -> Callable[[], Awaitable[bytes]]:
+    """
+    What FastAPI does with a model returned from a route with response_model
+    """
+    field = create_response_field(
+        name="Response_benchmark",
+        type_=PaginatedMeasurementListSchema,
+        mode="serialization",
+    )
+
+    async def render() -> bytes:
+        content = await serialize_response(field=field, response_content=page)
+        return response_class(content).body
+
+    return render
+
+
+def direct_path(page: PaginatedMeasurementListSchema) -> Callable[[], Awaitable[bytes]]:
+    async def render() -> bytes:
+        return PydanticJSONResponse(page).body
+
+    return render
+
+
+async def measure(render: Callable[[], Awaitable[bytes]], rounds: int) -> list[float]:
+    await render()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run(items: int, rounds: int) -> None:
+    page = generate_page(items)
+    paths = {
+        "response_model + json": response_model_path(JSONResponse, page),
+        "response_model + orjson": response_model_path(ORJSONResponse, page),
+        "PydanticJSONResponse": direct_path(page),
+    }
+    bodies = {name: await render() for name, render in paths.items()}
+    # all paths must produce the same document
+    assert len({orjson.dumps(orjson.loads(body)) for body in bodies.values()}) == 1
+    print(f"{items} items, {len(bodies['PydanticJSONResponse'])} bytes of JSON")
+    for name, render in paths.items():
+        timings = await measure(render, rounds)
+        print(
+            f"{name:>24}: median {statistics.median(timings):.2f} ms, "
+            f"min {min(timings):.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.items, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
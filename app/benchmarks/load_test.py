@@ -0,0 +1,358 @@
+"""
+Load test of the ingestion and auth hot paths against a running app backed by
+Postgres (e.g. docker compose up -d airq_app_db, then --start-app). Device
+payloads are signed with DEVICE_DATA_SECRET_KEY the same way sensors do.
+
+Scenarios:
+ - measurements: single readings of --devices known devices;
+ - batch: --batch-size readings per request;
+ - new-devices: every --concurrency requests report the same unseen device
+   at once, exercising concurrent device registration;
+ - auth: password logins of --username (created with --create-user);
+ - upload: signed NDJSON bulk uploads of --upload-size readings.
+
+Usage: python -m benchmarks.load_test [--base-url URL | --start-app]
+       [--scenario NAME ...] [--concurrency N] [--requests N] [--devices N]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import httpx
+from jose import jwt
+from sqlalchemy import create_engine, func, select
+
+from core.config import settings
+from db.models import Users
+from db.models.devices import Devices, Measurements
+from services.hash_password import get_password_hash
+from services.measurements_upload import sign_upload
+
+SCENARIOS = ("measurements", "batch", "new-devices", "auth", "upload")
+
+
+class ScenarioResult:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies_ms: list[float] = []
+        self.statuses: Counter[int | str] = Counter()
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def report(self) -> str:
+        latencies = sorted(self.latencies_ms) or [0.0]
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+
+        def percentile(p: int) -> float:
+            return quantiles[p - 1] if quantiles else latencies[0]
+
+        return (
+            f"{self.name:>12}: {len(self.latencies_ms)} requests in "
+            f"{self.elapsed:.1f}s, {len(self.latencies_ms) / self.elapsed:.0f} req/s, "
+            f"{self.rows / self.elapsed:.0f} stored rows/s, "
+            f"p50 {percentile(50):.1f} ms, p95 {percentile(95):.1f} ms, "
+            f"p99 {percentile(99):.1f} ms, statuses {dict(self.statuses)}"
+        )
+
+
+def measurement_record(device_uid: str, time_: datetime) -> dict:
+    return {
+        "device_id": device_uid,
+        "sensor_type": "benchmark",
+        "time": time_.isoformat(),
+        "pm1": round(random.uniform(0, 50), 1),
+        "pm2_5": round(random.uniform(0, 80), 1),
+        "pm10": round(random.uniform(0, 120), 1),
+        "humidity": round(random.uniform(20, 90), 1),
+        "temperature": round(random.uniform(-10, 35), 1),
+        "noise": round(random.uniform(30, 90), 1),
+    }
+
+
+def sign_measurement(device_uid: str, time_: datetime) -> str:
+    return jwt.encode(
+        measurement_record(device_uid, time_),
+        settings.DEVICE_DATA_SECRET_KEY,
+        algorithm=settings.DEVICE_DATA_ALGORITHM,
+    )
+
+
+# number of readings a response reports as stored
+RowsCounter = Callable[[dict], int]
+Request = tuple[str, str, dict, RowsCounter]
+
+
+def stored_reading(body: dict) -> int:
+    return 0 if body.get("duplicate") else 1
+
+
+def stored_batch_readings(body: dict) -> int:
+    return sum(item["status"] == "created" for item in body["items"])
+
+
+def stored_upload_readings(body: dict) -> int:
+    return body["accepted"]
+
+
+def no_readings(body: dict) -> int:
+    return 0
+
+
+class RequestFactory:
+    """
+    Builds the n-th request of a scenario: (method, path, request kwargs,
+    counter of stored readings in the response body)
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.devices = [f"bench-{self.run_id}-{i}" for i in range(args.devices)]
+        self.start_time = datetime.utcnow() - timedelta(days=1)
+
+    def _time(self, scenario: str, n: int) -> datetime:
+        # readings of a scenario get their own range of timestamps, so that
+        # no scenario repeats (device, time) keys of another one
+        span = max(self.args.requests, self.args.batch_size, self.args.upload_size)
+        offset = SCENARIOS.index(scenario) * span
+        return self.start_time + timedelta(milliseconds=offset + n)
+
+    def measurements(self, n: int) -> Request:
+        payload = sign_measurement(
+            self.devices[n % len(self.devices)], self._time("measurements", n)
+        )
+        return (
+            "POST",
+            "/devices/measurements",
+            {"json": {"data": payload}},
+            stored_reading,
+        )
+
+    def batch(self, n: int) -> Request:
+        size = self.args.batch_size
+        data = [
+            sign_measurement(
+                self.devices[(n * size + i) % len(self.devices)],
+                self._time("batch", n * size + i),
+            )
+            for i in range(size)
+        ]
+        return (
+            "POST",
+            "/devices/measurements/batch",
+            {"json": {"data": data}},
+            stored_batch_readings,
+        )
+
+    def new_devices(self, n: int) -> Request:
+        device_uid = f"bench-{self.run_id}-new-{n // self.args.concurrency}"
+        payload = sign_measurement(device_uid, self._time("new-devices", n))
+        return (
+            "POST",
+            "/devices/measurements",
+            {"json": {"data": payload}},
+            stored_reading,
+        )
+
+    def auth(self, n: int) -> Request:
+        form = {"username": self.args.username, "password": self.args.password}
+        return "POST", "/auth/token", {"data": form}, no_readings
+
+    def upload(self, n: int) -> Request:
+        size = self.args.upload_size
+        body = "".join(
+            json.dumps(
+                measurement_record(
+                    self.devices[(n * size + i) % len(self.devices)],
+                    self._time("upload", n * size + i),
+                )
+            )
+            + "\n"
+            for i in range(size)
+        ).encode()
+        kwargs = {"content": body, "headers": {"X-Signature": sign_upload(body)}}
+        return "POST", "/devices/measurements/upload", kwargs, stored_upload_readings
+
+    def get(self, scenario: str) -> Callable[[int], Request]:
+        return getattr(self, scenario.replace("-", "_"))
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    build_request: Callable[[int], Request],
+    requests: int,
+    concurrency: int,
+) -> ScenarioResult:
+    result = ScenarioResult(name)
+    next_request = iter(range(requests))
+
+    async def worker() -> None:
+        for n in next_request:
+            method, path, kwargs, count_rows = build_request(n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+            result.statuses[status] += 1
+            if status == 200:
+                result.rows += count_rows(response.json())
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def create_user(username: str, password: str) -> None:
+    engine = create_engine(url=settings.DATABASE_URL)
+    with engine.begin() as conn:
+        exists = conn.execute(select(Users.id).where(Users.username == username))
+        if exists.first() is None:
+            conn.execute(
+                Users.__table__.insert().values(
+                    id=uuid.uuid4(),
+                    username=username,
+                    password_hash=get_password_hash(password),
+                )
+            )
+    engine.dispose()
+
+
+def check_new_devices(run_id: str, requests: int, concurrency: int) -> None:
+    """
+    Every uid of the new-devices scenario must be registered exactly once
+    and keep all readings reported for it
+    """
+    uids = {f"bench-{run_id}-new-{n // concurrency}" for n in range(requests)}
+    engine = create_engine(url=settings.DATABASE_URL)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(
+                Devices.uid,
+                func.count(func.distinct(Devices.id)),
+                func.count(Measurements.id),
+            )
+            .select_from(Devices)
+            .outerjoin(Measurements, Measurements.device_id == Devices.id)
+            .where(Devices.uid.in_(uids))
+            .group_by(Devices.uid)
+        ).all()
+    engine.dispose()
+    readings = sum(count for _, _, count in rows)
+    passed = len(rows) == len(uids) and all(devices == 1 for _, devices, _ in rows)
+    print(
+        f"{'new-devices':>12}: {len(uids)} uids, {len(rows)} registered, "
+        f"{readings}/{requests} readings stored - " + ("ok" if passed else "FAILED")
+    )
+
+
+def start_app(port: int, workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ]
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start")
+
+
+async def run(args: argparse.Namespace, base_url: str) -> None:
+    factory = RequestFactory(args)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url + settings.API_V1_STR, limits=limits, timeout=args.timeout
+    ) as client:
+        for scenario in args.scenario:
+            requests = args.requests
+            if scenario == "batch":
+                requests = max(1, requests // args.batch_size)
+            elif scenario == "upload":
+                requests = max(1, requests // args.upload_size)
+            result = await run_scenario(
+                client, scenario, factory.get(scenario), requests, args.concurrency
+            )
+            print(result.report())
+            if scenario == "new-devices":
+                check_new_devices(factory.run_id, requests, args.concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument(
+        "--start-app",
+        action="store_true",
+        help="run uvicorn against DATABASE_URL instead of using --base-url",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--scenario", choices=SCENARIOS, nargs="+", default=list(SCENARIOS)
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=5000,
+        help="requests per scenario, batch and upload send this many readings",
+    )
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--upload-size", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--username", default="benchmark")
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument(
+        "--create-user", action="store_true", help="create --username in the db"
+    )
+    args = parser.parse_args()
+
+    if args.create_user:
+        create_user(args.username, args.password)
+
+    process: Optional[subprocess.Popen] = None
+    base_url = args.base_url
+    if args.start_app:
+        process = start_app(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compares the current measurements layout with the compact one: rows/sec
+inserted in batches and on-disk bytes per row (heap, indexes and toast).
+Tables are created as bench_* copies of both layouts and dropped at the end,
+run it against a scratch database.
+
+Usage: python -m benchmarks.storage_layout [--rows N] [--batch-size N]
+       [--devices N]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.sql import text
+
+from core.config import settings
+from schemas.measurements import MEASUREMENT_CHANNELS
+
+CHANNELS = ", ".join(MEASUREMENT_CHANNELS)
+
+LAYOUTS = {
+    "current": (
+        "CREATE TABLE bench_measurements_current ("
+        "id uuid NOT NULL, created_at timestamp DEFAULT now(), "
+        "modified_at timestamp, deleted_at timestamp, time_ timestamp NOT NULL, "
+        "pm1 numeric, pm2_5 numeric, pm10 numeric, "
+        "humidity real, temperature real, noise real, device_id uuid NOT NULL, "
+        "PRIMARY KEY (id, time_))",
+        "CREATE INDEX ON bench_measurements_current (device_id, time_)",
+        "CREATE INDEX ON bench_measurements_current (time_) WHERE deleted_at IS NULL",
+    ),
+    "compact": (
+        "CREATE TABLE bench_measurements_compact ("
+        "device_id uuid NOT NULL, time_ timestamp NOT NULL, "
+        "pm1 real, pm2_5 real, pm10 real, "
+        "humidity real, temperature real, noise real, "
+        "PRIMARY KEY (device_id, time_))",
+    ),
+}
+
+
+def generate_rows(rows: int, devices: int) -> list[dict]:
+    device_ids = [uuid.uuid4() for _ in range(devices)]
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "device_id": device_ids[i % devices],
+            "time_": start + timedelta(seconds=i),
+            "pm1": round(random.uniform(0, 50), 1),
+            "pm2_5": round(random.uniform(0, 80), 1),
+            "pm10": round(random.uniform(0, 120), 1),
+            "humidity": round(random.uniform(20, 90), 1),
+            "temperature": round(random.uniform(-10, 35), 1),
+            "noise": round(random.uniform(30, 90), 1),
+        }
+        for i in range(rows)
+    ]
+
+
+async def bench_layout(
+    conn: AsyncConnection, layout: str, rows: list[dict], batch_size: int
+) -> tuple[float, float]:
+    table = f"bench_measurements_{layout}"
+    for statement in LAYOUTS[layout]:
+        await conn.execute(text(statement))
+    await conn.commit()
+
+    columns = CHANNELS + ", device_id, time_"
+    if layout == "current":
+        columns += ", id"
+    insert = text(
+        f"INSERT INTO {table} ({columns}) "
+        f"VALUES ({', '.join(':' + c.strip() for c in columns.split(','))})"
+    )
+    started = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        await conn.execute(insert, rows[offset : offset + batch_size])
+        await conn.commit()
+    elapsed = time.perf_counter() - started
+
+    await conn.execute(text(f"VACUUM ANALYZE {table}"))
+    size = await conn.execute(text(f"SELECT pg_total_relation_size('{table}')"))
+    return len(rows) / elapsed, size.scalar() / len(rows)
+
+
+async def run(rows: int, batch_size: int, devices: int) -> None:
+    engine = create_async_engine(settings.async_database_url)
+    data = generate_rows(rows, devices)
+    try:
+        # VACUUM cannot run inside a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for layout in LAYOUTS:
+                await conn.execute(
+                    text(f"DROP TABLE IF EXISTS bench_measurements_{layout}")
+                )
+                rows_per_sec, bytes_per_row = await bench_layout(
+                    conn, layout, data, batch_size
+                )
+                print(
+                    f"{layout:>8}: {rows_per_sec:10.0f} rows/s "
+                    f"{bytes_per_row:8.1f} bytes/row"
+                )
+    finally:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for layout in LAYOUTS:
+                await conn.execute(
+                    text(f"DROP TABLE IF EXISTS bench_measurements_{layout}")
+                )
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--devices", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.batch_size, args.devices))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+KEY = TypeVar("KEY", bound=Hashable)
+VALUE = TypeVar("VALUE")
+
+
+class LRUTTLCache(Generic[KEY, VALUE]):
+    """
+    Bounded in-process LRU cache whose entries also expire after ttl seconds.
+    Not thread safe, meant to be used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[KEY, tuple[float, VALUE]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: KEY) -> Optional[VALUE]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: KEY, value: VALUE) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: KEY) -> None:
+        self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[VALUE], bool]) -> None:
+        """
+        Drops every entry whose value matches predicate
+        """
+        for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
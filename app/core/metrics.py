@@ -0,0 +1,174 @@
+"""
+Prometheus metrics of the app. Under gunicorn every worker keeps its own
+registry; set PROMETHEUS_MULTIPROC_DIR to a directory shared by the workers
+(emptied before start) to have /metrics aggregate all of them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+STAGE_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+)
+
+http_requests_total = Counter(
+    "http_requests_total",
+    "Handled requests",
+    ["method", "route", "status"],
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Request latency until the response is sent",
+    ["method", "route"],
+    buckets=REQUEST_LATENCY_BUCKETS,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+measurement_ingest_stage_duration_seconds = Histogram(
+    "measurement_ingest_stage_duration_seconds",
+    "Time spent in every stage of single measurement ingestion",
+    ["stage"],
+    buckets=STAGE_LATENCY_BUCKETS,
+)
+db_sessions_total = Counter(
+    "db_sessions_total",
+    "Request db sessions by whether they checked out a connection",
+    ["used"],
+)
+# pool label is "primary" or "replica"
+db_pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled db connection",
+    ["pool"],
+    buckets=STAGE_LATENCY_BUCKETS,
+)
+db_pool_timeouts_total = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts which gave up waiting for a pooled db connection",
+    ["pool"],
+)
+db_pool_size = Gauge(
+    "db_pool_size",
+    "Connections kept open by the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out",
+    "Pooled db connections in use",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Connections opened beyond the pool size, negative while the pool fills up",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurement_ingest_stage_duration_seconds.labels(stage).observe(
+            time.perf_counter() - started
+        )
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """
+    Records latency, status codes and in-flight requests per route template,
+    paths matching no route share the "unmatched" label
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    @staticmethod
+    def _get_route(scope: Scope) -> str:
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._get_route(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration_seconds.labels(method, route).observe(
+                time.perf_counter() - started
+            )
+            http_requests_total.labels(method, route, str(status_code)).inc()
+            in_progress.dec()
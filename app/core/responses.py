@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+class PydanticJSONResponse(ORJSONResponse):
+    """
+    Renders pydantic models with orjson from their plain python dump. Routes
+    return it for schemas which are validated already (e.g. built by cruds):
+    FastAPI sends returned responses as they are, skipping the re-validation
+    against response_model, which is then only used for the docs.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            # orjson encodes datetimes, UUIDs and enums the way pydantic does
+            content = content.model_dump()
+        return super().render(content)
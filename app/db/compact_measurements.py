@@ -0,0 +1,157 @@
+"""
+Online migration of measurements to the compact layout (measurements_compact).
+
+With MEASUREMENTS_COMPACT_SYNC set, inserts, updates and deletes of
+measurements are mirrored by the measurements_compact_sync trigger:
+ - sync: installs the trigger, or drops it when the setting is off, only if
+   its state differs (run by the entrypoint); the table is stale while it is
+   off;
+ - backfill: rebuilds compact rows from active measurements day by day, one
+   transaction per day, so it can be interrupted and re-run; run it after
+   enabling sync to catch up with the changes made while it was off;
+ - verify: compares per day row counts of both layouts.
+Once verify reports no differences, set MEASUREMENTS_COMPACT_READS=1 to serve
+aggregates and exports from the compact table. TRUNCATE of measurements is
+not mirrored.
+
+Usage: python -m db.compact_measurements {sync,backfill,verify}
+       [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import create_engine, Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import text
+
+from core.config import settings
+from schemas.measurements import MEASUREMENT_CHANNELS
+
+
+def install_sync_trigger(conn: Connection, enabled: bool) -> bool:
+    """
+    Creates or drops the trigger when its state differs from enabled and
+    tells whether it did. Both need an ACCESS EXCLUSIVE lock of measurements,
+    which queues every insert behind it while it waits, e.g. for an export,
+    so the lock is given up after MEASUREMENTS_COMPACT_SYNC_LOCK_TIMEOUT_MS
+    """
+    installed = conn.execute(
+        text(
+            "SELECT EXISTS (SELECT FROM pg_trigger "
+            "WHERE tgrelid = 'measurements'::regclass "
+            "AND tgname = 'measurements_compact_sync')"
+        )
+    ).scalar()
+    if installed == enabled:
+        return False
+    lock_timeout = int(settings.MEASUREMENTS_COMPACT_SYNC_LOCK_TIMEOUT_MS)
+    conn.execute(text(f"SET LOCAL lock_timeout = {lock_timeout}"))
+    if enabled:
+        conn.execute(
+            text(
+                "CREATE TRIGGER measurements_compact_sync "
+                "AFTER INSERT OR UPDATE OR DELETE ON measurements "
+                "FOR EACH ROW EXECUTE FUNCTION measurements_compact_sync()"
+            )
+        )
+    else:
+        conn.execute(text("DROP TRIGGER measurements_compact_sync ON measurements"))
+    return True
+
+
+def backfill_day(conn: Connection, day: datetime) -> int:
+    channels = ", ".join(MEASUREMENT_CHANNELS)
+    # replaced as a whole so that updates and deletes missed are caught up too
+    conn.execute(
+        text("DELETE FROM measurements_compact WHERE time_ >= :start AND time_ < :end"),
+        {"start": day, "end": day + timedelta(days=1)},
+    )
+    result = conn.execute(
+        text(
+            f"INSERT INTO measurements_compact (device_id, time_, {channels}) "
+            f"SELECT device_id, time_, {channels} FROM measurements "
+            "WHERE deleted_at IS NULL AND time_ >= :start AND time_ < :end "
+            "ON CONFLICT (device_id, time_) DO NOTHING"
+        ),
+        {"start": day, "end": day + timedelta(days=1)},
+    )
+    return result.rowcount
+
+
+def count_day_differences(conn: Connection, day: datetime) -> tuple[int, int]:
+    # duplicated (device_id, time_) raw rows collapse into one compact row
+    return conn.execute(
+        text(
+            "SELECT "
+            "(SELECT count(DISTINCT (device_id, time_)) FROM measurements "
+            "WHERE deleted_at IS NULL AND time_ >= :start AND time_ < :end), "
+            "(SELECT count(*) FROM measurements_compact "
+            "WHERE time_ >= :start AND time_ < :end)"
+        ),
+        {"start": day, "end": day + timedelta(days=1)},
+    ).one()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=("sync", "backfill", "verify"))
+    parser.add_argument(
+        "--start", type=date.fromisoformat, help="defaults to the first measurement"
+    )
+    parser.add_argument(
+        "--end", type=date.fromisoformat, help="exclusive, defaults to tomorrow"
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(url=settings.DATABASE_URL)
+    if args.command == "sync":
+        state = "installed" if settings.MEASUREMENTS_COMPACT_SYNC else "dropped"
+        try:
+            with engine.begin() as conn:
+                changed = install_sync_trigger(conn, settings.MEASUREMENTS_COMPACT_SYNC)
+        except OperationalError as e:
+            # a deploy must not wait for long running queries, re-run later
+            logger.error(f"measurements_compact_sync trigger not {state}: {e}")
+        else:
+            logger.info(
+                f"measurements_compact_sync trigger {state}"
+                + ("" if changed else " already")
+            )
+        engine.dispose()
+        return
+
+    start = args.start
+    if start is None:
+        with engine.connect() as conn:
+            first_time = conn.execute(text("SELECT min(time_) FROM measurements"))
+            first_time = first_time.scalar()
+        start = first_time.date() if first_time else date.today()
+    end = args.end or date.today() + timedelta(days=1)
+
+    differences = 0
+    day = start
+    while day < end:
+        day_start = datetime.combine(day, datetime.min.time())
+        with engine.begin() as conn:
+            if args.command == "backfill":
+                copied = backfill_day(conn, day_start)
+                logger.info(f"{day.isoformat()}: {copied} rows copied")
+            else:
+                raw, compact = count_day_differences(conn, day_start)
+                if raw != compact:
+                    differences += 1
+                    logger.warning(f"{day.isoformat()}: {raw} raw, {compact} compact")
+        day += timedelta(days=1)
+    engine.dispose()
+
+    if args.command == "verify":
+        logger.info(f"Days with differences: {differences}")
+        raise SystemExit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,27 @@
 import abc
+import base64
+import json
 import logging
+from datetime import datetime
 from typing import Generic, TypeVar, Type, Callable, Optional, Sequence, Tuple
 from fastapi import HTTPException
 
-from sqlalchemy import Select, Update, Delete, ColumnClause, Result, Row
-from sqlalchemy import func, column, update, delete
+from sqlalchemy import Select, Update, Delete, Insert, ColumnClause, Result, Row
+from sqlalchemy import func, column, update, delete, insert, text, tuple_
+from sqlalchemy import ColumnElement
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.elements import UnaryExpression
 from sqlalchemy.future import select
 from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import operators
 from core.config import settings, EnvironmentEnum
 from db.models.base import Base as BaseDbModel
-from schemas.base import BaseSchema, BasePaginatedSchema
+from schemas.base import (
+    BaseSchema,
+    BasePaginatedSchema,
+    BaseCursorPaginatedSchema,
+    TotalCountModeEnum,
+)
 
 IN_SCHEMA = TypeVar("IN_SCHEMA", bound=BaseSchema)
 OUT_SCHEMA = TypeVar("OUT_SCHEMA", bound=BaseSchema)
@@ -84,6 +94,10 @@ class BaseCrud(
     @abc.abstractmethod
     def _paginated_list_item_schema(self) -> Type[PAGINATED_LIST_ITEM_SCHEMA]: ...
 
+    @property
+    def _cursor_paginated_schema(self) -> Type[BaseCursorPaginatedSchema]:
+        return BaseCursorPaginatedSchema[self._paginated_list_item_schema]
+
     @property
     def out_schema_columns(self) -> list[ColumnClause]:
         return [column(i) for i in self._out_schema.model_fields.keys()]
@@ -95,16 +109,46 @@ class BaseCrud(
             for i in self._paginated_list_item_schema.model_fields.keys()
         ]
 
+    @property
+    def _insert_returning_stmt(self) -> Insert:
+        table = self._table.__table__
+        return insert(table).returning(
+            *[table.c[i] for i in self._out_schema.model_fields.keys()],
+            sort_by_parameter_order=True,
+        )
+
     async def create(
         self, in_schema: IN_SCHEMA, additional_data: dict[str, any] = None
     ) -> OUT_SCHEMA:
+        """
+        Inserts the entry with a Core INSERT ... RETURNING, bypassing the ORM
+        unit of work: the created entry is not added to the session
+        """
         in_data = in_schema.model_dump()
         if additional_data is not None:
             in_data.update(**additional_data)
-        entry = self._table(**in_data)
-        self._db_session.add(entry)
-        await self._db_session.flush()
-        return self._out_schema.model_validate(entry)
+        result = await self._db_session.execute(
+            self._insert_returning_stmt.values(**in_data)
+        )
+        return self._out_schema.model_validate(result.one())
+
+    async def create_many(
+        self,
+        in_schemas: Sequence[IN_SCHEMA],
+        additional_data: Sequence[dict[str, any]] = None,
+    ) -> list[OUT_SCHEMA]:
+        """
+        Inserts all entries with a single multi-row INSERT ... RETURNING,
+        returned items keep the order of in_schemas
+        """
+        if not in_schemas:
+            return []
+        rows = [in_schema.model_dump() for in_schema in in_schemas]
+        if additional_data is not None:
+            for row, extra in zip(rows, additional_data):
+                row.update(**extra)
+        result = await self._db_session.execute(self._insert_returning_stmt, rows)
+        return [self._out_schema.model_validate(entry) for entry in result.all()]
 
     async def get_by_id(
         self, entry_id, active_only=True, filter_statement=None
@@ -162,6 +206,34 @@ class BaseCrud(
         await self._db_session.flush()
         return
 
+    async def get_estimated_count(self) -> int:
+        """
+        Planner estimate of the table rows (including all of its partitions)
+        taken from pg_class.reltuples; ignores any filters
+        """
+        result = await self._db_session.execute(
+            text(
+                "SELECT coalesce(sum(greatest(reltuples, 0)), 0)::bigint "
+                "FROM pg_class WHERE oid = to_regclass(:table) OR oid IN "
+                "(SELECT inhrelid FROM pg_inherits "
+                "WHERE inhparent = to_regclass(:table))"
+            ),
+            {"table": self._table.__tablename__},
+        )
+        return result.scalar()
+
+    async def _get_total_count(
+        self, count_stmt: Select, total_count_mode: TotalCountModeEnum
+    ) -> Optional[int]:
+        match total_count_mode:
+            case TotalCountModeEnum.EXACT:
+                result: Result = await self._db_session.execute(count_stmt)
+                return result.scalar()
+            case TotalCountModeEnum.ESTIMATED:
+                return await self.get_estimated_count()
+            case _:
+                return None
+
     async def get_paginated_list(
         self,
         *,
@@ -173,7 +245,8 @@ class BaseCrud(
         join_fn: Optional[Callable[[Select], Select]] = None,
         custom_select_statement: Optional[Select] = None,
         return_raw_result: bool = False,
-    ) -> PAGINATED_SCHEMA | Tuple[int, Sequence[Row]]:
+        total_count_mode: TotalCountModeEnum = TotalCountModeEnum.EXACT,
+    ) -> PAGINATED_SCHEMA | Tuple[Optional[int], Sequence[Row]]:
         if order_by is None:
             order_by = self.default_ordering
 
@@ -200,10 +273,9 @@ class BaseCrud(
             select_stmt = select_stmt.where(filter_statement)
             count_stmt = count_stmt.where(filter_statement)
 
-        total_count: Result = await self._db_session.execute(count_stmt)
-        total_count: int = total_count.scalar()
+        total_count = await self._get_total_count(count_stmt, total_count_mode)
 
-        if total_count > 0:
+        if total_count != 0:
             result: Result = await self._db_session.execute(select_stmt)
             entries = result.all()
         else:
@@ -219,3 +291,94 @@ class BaseCrud(
                 for entry in entries
             ],
         )
+
+    @staticmethod
+    def _encode_cursor(value, entry_id) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps([value, str(entry_id)], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def _decode_cursor(self, cursor: str, order_column: ColumnElement) -> tuple:
+        try:
+            value, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            python_type = order_column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None:
+                value = python_type(value)
+            return value, self._table.id.type.python_type(entry_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def get_cursor_paginated_list(
+        self,
+        *,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: UnaryExpression = None,
+        active_only=True,
+        filter_statement=None,
+        join_fn: Optional[Callable[[Select], Select]] = None,
+        total_count_mode: TotalCountModeEnum = TotalCountModeEnum.NONE,
+    ) -> BaseCursorPaginatedSchema:
+        """
+        Keyset pagination: seeks on (ordering column, id) after the position
+        encoded in cursor instead of scanning and skipping OFFSET rows.
+        The ordering column must not be nullable.
+        """
+        if order_by is None:
+            order_by = self.default_ordering
+        order_column = order_by.element
+        descending = order_by.modifier is operators.desc_op
+
+        select_stmt = self.apply_active_statement(
+            select(
+                *self.paginated_list_item_schema_columns,
+                order_column.label("cursor_value"),
+                self._table.id.label("cursor_id"),
+            ).select_from(self._table),
+            active_only,
+        )
+        count_stmt = self.apply_active_statement(
+            select(func.count()).select_from(self._table), active_only
+        )
+
+        if join_fn is not None:
+            select_stmt = join_fn(select_stmt)
+            count_stmt = join_fn(count_stmt)
+
+        if filter_statement is not None:
+            select_stmt = select_stmt.where(filter_statement)
+            count_stmt = count_stmt.where(filter_statement)
+
+        if cursor is not None:
+            position = tuple_(order_column, self._table.id)
+            cursor_position = tuple_(*self._decode_cursor(cursor, order_column))
+            select_stmt = select_stmt.where(
+                position < cursor_position if descending else position > cursor_position
+            )
+
+        id_order_by = self._table.id.desc() if descending else self._table.id.asc()
+        # one extra row tells whether there is a next page
+        select_stmt = select_stmt.order_by(order_by, id_order_by).limit(limit + 1)
+
+        total_count = await self._get_total_count(count_stmt, total_count_mode)
+        result: Result = await self._db_session.execute(select_stmt)
+        entries = result.all()
+
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = self._encode_cursor(
+                entries[-1].cursor_value, entries[-1].cursor_id
+            )
+
+        return self._cursor_paginated_schema(
+            total=total_count,
+            next_cursor=next_cursor,
+            items=[
+                self._paginated_list_item_schema.model_validate(entry)
+                for entry in entries
+            ],
+        )
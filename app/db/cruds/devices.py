@@ -1,8 +1,12 @@
-from typing import Type  # noqa
+import uuid
+from typing import Type, Iterable, Sequence  # noqa
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql.elements import UnaryExpression
+from core.cache import LRUTTLCache
+from core.config import settings
 from db.cruds.base import BaseCrud
 from db.models.devices import Devices as DevicesTable
 from schemas.devices import (
@@ -12,6 +16,14 @@ from schemas.devices import (
     DeviceCreateSchema,
 )
 
+# uid -> active device, shared by all DevicesCrud instances of the process
+devices_cache: LRUTTLCache[str, DeviceSchema] = LRUTTLCache(
+    maxsize=settings.DEVICES_CACHE_MAX_SIZE,
+    ttl=settings.DEVICES_CACHE_TTL_SECONDS,
+)
+# session.info key of ids of devices changed by the session transaction
+EVICTED_DEVICE_IDS_KEY = "evicted_device_ids"
+
 
 class DevicesCrud(
     BaseCrud[
@@ -43,11 +55,62 @@ class DevicesCrud(
     def _paginated_list_item_schema(self) -> Type[DeviceSchema]:
         return DeviceSchema
 
+    async def create(
+        self, in_schema: DeviceCreateSchema, additional_data: dict[str, any] = None
+    ) -> DeviceSchema:
+        devices_cache.pop(in_schema.uid)
+        return await super().create(in_schema, additional_data)
+
+    async def update_by_id(
+        self,
+        entry_id,
+        in_data: DevicePartialUpdateSchema,
+        active_only=True,
+        raise_404=True,
+        filter_statement=None,
+    ) -> None:
+        await super().update_by_id(
+            entry_id, in_data, active_only, raise_404, filter_statement
+        )
+        self._evict_on_commit(entry_id)
+
+    async def delete_by_id(
+        self, entry_id, permanently=False, raise_404=True, filter_statement=None
+    ) -> None:
+        await super().delete_by_id(entry_id, permanently, raise_404, filter_statement)
+        self._evict_on_commit(entry_id)
+
+    def _evict_on_commit(self, entry_id) -> None:
+        """
+        Drops the cached device now and again once the change is committed:
+        until then other sessions still read, and may cache, the old row
+        """
+        devices_cache.pop_where(lambda device: device.id == entry_id)
+        self._db_session.info.setdefault(EVICTED_DEVICE_IDS_KEY, set()).add(entry_id)
+
+    async def commit_session(self):
+        await super().commit_session()
+        evicted = self._db_session.info.pop(EVICTED_DEVICE_IDS_KEY, set())
+        if evicted:
+            devices_cache.pop_where(lambda device: device.id in evicted)
+
+    async def rollback_session(self):
+        await super().rollback_session()
+        self._db_session.info.pop(EVICTED_DEVICE_IDS_KEY, None)
+
     async def get_device_by_uid(
         self,
         uid,
         active_only=True,
+        use_cache=False,
     ) -> DeviceSchema:
+        """
+        Gets device by uid; with use_cache active devices are served
+        from the in-process cache and the db is queried only on a miss
+        """
+        use_cache = use_cache and active_only
+        if use_cache and (device := devices_cache.get(uid)) is not None:
+            return device
         stmt = self.apply_active_statement(
             select(*self.out_schema_columns)
             .select_from(self._table)
@@ -58,4 +121,102 @@ class DevicesCrud(
         entry = result.first()
         if not entry:
             raise HTTPException(status_code=404, detail="Object not found")
-        return self._out_schema.model_validate(entry)
+        device = self._out_schema.model_validate(entry)
+        if use_cache:
+            devices_cache.set(uid, device)
+        return device
+
+    async def get_devices_by_uids(
+        self,
+        uids: Iterable[str],
+        active_only=True,
+        use_cache=False,
+    ) -> dict[str, DeviceSchema]:
+        """
+        Resolves many devices with a single query, returns mapping uid -> device.
+        Unknown uids are absent from the result.
+        """
+        use_cache = use_cache and active_only
+        devices = {}
+        missing = set()
+        for uid in set(uids):
+            if use_cache and (device := devices_cache.get(uid)) is not None:
+                devices[uid] = device
+            else:
+                missing.add(uid)
+        if not missing:
+            return devices
+        stmt = self.apply_active_statement(
+            select(*self.out_schema_columns)
+            .select_from(self._table)
+            .where(self._table.uid.in_(missing)),
+            active_only,
+        )
+        result = await self._db_session.execute(stmt)
+        for device in map(self._out_schema.model_validate, result.all()):
+            devices[device.uid] = device
+            if use_cache:
+                devices_cache.set(device.uid, device)
+        return devices
+
+    async def get_or_create_by_uid(
+        self, in_schema: DeviceCreateSchema, use_cache=False
+    ) -> DeviceSchema:
+        """
+        Returns device with in_schema.uid creating it if it does not exist yet,
+        safe against concurrent registration of the same uid
+        """
+        devices = await self.get_or_create_many_by_uids([in_schema], use_cache)
+        if in_schema.uid not in devices:
+            raise HTTPException(status_code=403, detail="Device is deleted")
+        return devices[in_schema.uid]
+
+    async def get_or_create_many_by_uids(
+        self, in_schemas: Sequence[DeviceCreateSchema], use_cache=False
+    ) -> dict[str, DeviceSchema]:
+        """
+        Resolves devices by uid registering unknown ones with a single
+        INSERT ... ON CONFLICT (uid) DO UPDATE ... RETURNING round trip.
+        Returns mapping uid -> device; uids of soft deleted devices are
+        absent, they are not revived by new readings.
+        """
+        devices = {}
+        to_upsert: dict[str, DeviceCreateSchema] = {}
+        for in_schema in in_schemas:
+            if in_schema.uid in devices or in_schema.uid in to_upsert:
+                continue
+            if use_cache and (device := devices_cache.get(in_schema.uid)) is not None:
+                devices[in_schema.uid] = device
+            else:
+                to_upsert[in_schema.uid] = in_schema
+        if not to_upsert:
+            return devices
+
+        # stable uid order makes concurrent batches lock rows in the same order
+        rows = [
+            {"id": uuid.uuid4(), **to_upsert[uid].model_dump()}
+            for uid in sorted(to_upsert)
+        ]
+        stmt = insert(self._table).values(rows)
+        # no-op on conflict updates are needed for RETURNING to yield existing rows
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self._table.uid],
+            set_={
+                "sensor_type": func.coalesce(
+                    self._table.sensor_type, stmt.excluded.sensor_type
+                )
+            },
+        ).returning(
+            *[getattr(self._table, i) for i in self._out_schema.model_fields.keys()],
+            literal_column("xmax = 0").label("inserted"),
+        )
+        result = await self._db_session.execute(stmt)
+        for entry in result.all():
+            if entry.deleted_at is not None:
+                continue
+            device = self._out_schema.model_validate(entry)
+            devices[device.uid] = device
+            # rows created by this transaction are cached only once committed
+            if use_cache and not entry.inserted:
+                devices_cache.set(device.uid, device)
+        return devices
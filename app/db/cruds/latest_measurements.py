@@ -0,0 +1,103 @@
+from typing import Sequence
+
+from sqlalchemy import func, select, FromClause
+from sqlalchemy.dialects.postgresql import insert, Insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models.devices import Devices, DevicesLatestMeasurements
+from schemas.measurements import (
+    LatestMeasurementSchema,
+    MeasurementItemSchema,
+    MEASUREMENT_CHANNELS,
+)
+
+
+class LatestMeasurementsCrud:
+    """
+    Newest measurement per device, kept up to date by the ingestion path
+    """
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self._db_session: AsyncSession = db_session
+
+    async def upsert(self, measurements: Sequence[MeasurementItemSchema]) -> None:
+        """
+        Stores the newest of measurements per device unless
+        a newer one is stored already
+        """
+        latest: dict = {}
+        for measurement in measurements:
+            current = latest.get(measurement.device_id)
+            if current is None or measurement.time_ >= current.time_:
+                latest[measurement.device_id] = measurement
+        if not latest:
+            return
+
+        stmt = insert(DevicesLatestMeasurements).values(
+            [
+                {
+                    "device_id": device_id,
+                    "time_": latest[device_id].time_,
+                    **{
+                        channel: getattr(latest[device_id], channel)
+                        for channel in MEASUREMENT_CHANNELS
+                    },
+                }
+                for device_id in sorted(latest)
+            ]
+        )
+        await self._db_session.execute(self._on_conflict_keep_newest(stmt))
+
+    async def upsert_from(self, source: FromClause) -> None:
+        """
+        Same as upsert for measurements selected from source (device_id, time_
+        and channel columns), picking the newest per device in the db
+        """
+        columns = ("device_id", "time_", *MEASUREMENT_CHANNELS)
+        select_stmt = (
+            select(*[source.c[column] for column in columns])
+            .distinct(source.c.device_id)
+            .order_by(source.c.device_id, source.c.time_.desc())
+        )
+        await self._db_session.execute(
+            self._on_conflict_keep_newest(
+                insert(DevicesLatestMeasurements).from_select(columns, select_stmt)
+            )
+        )
+
+    @staticmethod
+    def _on_conflict_keep_newest(stmt: Insert) -> Insert:
+        table = DevicesLatestMeasurements
+        return stmt.on_conflict_do_update(
+            index_elements=[table.device_id],
+            set_={
+                "time_": stmt.excluded.time_,
+                "updated_at": func.now(),
+                **{channel: stmt.excluded[channel] for channel in MEASUREMENT_CHANNELS},
+            },
+            where=stmt.excluded.time_ >= table.time_,
+        )
+
+    async def get_list(self) -> list[LatestMeasurementSchema]:
+        """
+        Latest measurements of all active devices
+        """
+        stmt = (
+            select(
+                DevicesLatestMeasurements.device_id,
+                DevicesLatestMeasurements.time_,
+                *[
+                    getattr(DevicesLatestMeasurements, channel)
+                    for channel in MEASUREMENT_CHANNELS
+                ],
+                Devices.uid,
+                Devices.name,
+                Devices.lat,
+                Devices.long,
+            )
+            .join(Devices, Devices.id == DevicesLatestMeasurements.device_id)
+            .where(Devices.deleted_at.is_(None))
+            .order_by(Devices.uid)
+        )
+        result = await self._db_session.execute(stmt)
+        return [LatestMeasurementSchema.model_validate(entry) for entry in result.all()]
@@ -1,15 +1,57 @@
-from typing import Type  # noqa
+from datetime import datetime
+from typing import AsyncIterator, Optional, Sequence, Type  # noqa
+from uuid import UUID, uuid4
 
+from sqlalchemy import func, literal, select, cast, Interval, Row, Select, REAL
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql.elements import UnaryExpression
 from db.cruds.base import BaseCrud
-from db.models.devices import Measurements as MeasurementsTable
+from core.config import settings
+from db.models.devices import Measurements as MeasurementsTable, Devices
+from db.models.devices import MeasurementsCompact as MeasurementsCompactTable
 from schemas.measurements import (
     MeasurementItemSchema,
     PaginatedMeasurementListSchema,
+    CursorPaginatedMeasurementListSchema,
     MeasurementPartialUpdateSchema,
     MeasurementCreateSchema,
+    MeasurementAggregateSchema,
+    MeasurementBucketEnum,
+    MEASUREMENT_CHANNELS,
 )
 
+# buckets are aligned to this point, e.g. 5m buckets start at :00, :05, ...
+BUCKETS_ORIGIN = datetime(2000, 1, 1)
+
+
+def align_to_buckets(
+    start: datetime, end: datetime, bucket: MeasurementBucketEnum
+) -> tuple[datetime, datetime]:
+    """
+    Widens [start, end) to whole buckets: start is aligned down, end up
+    """
+    start -= (start - BUCKETS_ORIGIN) % bucket.interval
+    if remainder := (end - BUCKETS_ORIGIN) % bucket.interval:
+        end += bucket.interval - remainder
+    return start, end
+
+
+def aggregate_entry_to_schema(entry) -> MeasurementAggregateSchema:
+    """
+    Maps row with bucket, count and {channel}_{min,avg,max} columns
+    """
+    return MeasurementAggregateSchema(
+        bucket=entry.bucket,
+        count=entry.count,
+        **{
+            channel: {
+                stat: getattr(entry, f"{channel}_{stat}")
+                for stat in ("min", "avg", "max")
+            }
+            for channel in MEASUREMENT_CHANNELS
+        },
+    )
+
 
 class MeasurementsCrud(
     BaseCrud[
@@ -31,12 +73,134 @@ class MeasurementsCrud(
 
     @property
     def default_ordering(self) -> UnaryExpression:
-        return MeasurementsTable.created_at.desc()
+        return MeasurementsTable.time_.desc()
 
     @property
     def _paginated_schema(self) -> Type[PaginatedMeasurementListSchema]:
         return PaginatedMeasurementListSchema
 
+    @property
+    def _cursor_paginated_schema(self) -> Type[CursorPaginatedMeasurementListSchema]:
+        return CursorPaginatedMeasurementListSchema
+
     @property
     def _paginated_list_item_schema(self) -> Type[MeasurementItemSchema]:
         return MeasurementItemSchema
+
+    async def create_many_skip_duplicates(
+        self,
+        in_schemas: Sequence[MeasurementCreateSchema],
+        additional_data: Sequence[dict[str, any]] = None,
+    ) -> list[Optional[MeasurementItemSchema]]:
+        """
+        Inserts measurements with ON CONFLICT (device_id, time_) DO NOTHING;
+        returned list follows in_schemas, None marks an already stored reading
+        """
+        if not in_schemas:
+            return []
+        rows = [in_schema.model_dump() for in_schema in in_schemas]
+        if additional_data is not None:
+            for row, extra in zip(rows, additional_data):
+                row.update(**extra)
+        # ids are generated here to match RETURNING rows back to in_schemas
+        for row in rows:
+            row.setdefault("id", uuid4())
+        table = MeasurementsTable.__table__
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.device_id, table.c.time_])
+            .returning(*[table.c[i] for i in self._out_schema.model_fields.keys()])
+        )
+        result = await self._db_session.execute(stmt, rows)
+        created = {
+            entry.id: self._out_schema.model_validate(entry) for entry in result.all()
+        }
+        return [created.get(row["id"]) for row in rows]
+
+    @property
+    def _values_table(self) -> Type[MeasurementsTable | MeasurementsCompactTable]:
+        """
+        Table analytical reads (aggregates, export) are served from
+        """
+        if settings.MEASUREMENTS_COMPACT_READS:
+            return MeasurementsCompactTable
+        return MeasurementsTable
+
+    def _apply_values_active_statement(self, stmt: Select) -> Select:
+        # compact layout keeps active measurements only
+        return self.apply_active_statement(
+            stmt, self._values_table is MeasurementsTable
+        )
+
+    async def get_aggregated_list(
+        self,
+        device_id: UUID,
+        start: datetime,
+        end: datetime,
+        bucket: MeasurementBucketEnum,
+    ) -> list[MeasurementAggregateSchema]:
+        """
+        min/avg/max of every channel per time bucket in [start, end),
+        computed by the db with date_bin; see align_to_buckets
+        """
+        table = self._values_table
+        bucket_column = func.date_bin(
+            literal(bucket.interval, Interval),
+            table.time_,
+            literal(BUCKETS_ORIGIN),
+        ).label("bucket")
+        channel_columns = []
+        for channel in MEASUREMENT_CHANNELS:
+            value = getattr(table, channel)
+            channel_columns += [
+                func.min(value).label(f"{channel}_min"),
+                func.avg(value).label(f"{channel}_avg"),
+                func.max(value).label(f"{channel}_max"),
+            ]
+        stmt = self._apply_values_active_statement(
+            select(bucket_column, func.count().label("count"), *channel_columns)
+            .where(
+                table.device_id == device_id,
+                table.time_ >= start,
+                table.time_ < end,
+            )
+            .group_by(bucket_column)
+            .order_by(bucket_column)
+        )
+        result = await self._db_session.execute(stmt)
+        return [aggregate_entry_to_schema(entry) for entry in result.all()]
+
+    async def stream_export(
+        self,
+        start: datetime,
+        end: datetime,
+        device_ids: Optional[Sequence[UUID]] = None,
+        fetch_size: int = 5000,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Yields chunks of at most fetch_size rows (device_uid, time_, channels...)
+        in [start, end) ordered by time, read through a server-side cursor
+        """
+        table = self._values_table
+        stmt = self._apply_values_active_statement(
+            select(
+                Devices.uid.label("device_uid"),
+                table.time_,
+                *[
+                    cast(getattr(table, channel), REAL).label(channel)
+                    for channel in MEASUREMENT_CHANNELS
+                ],
+            )
+            .join(Devices, Devices.id == table.device_id)
+            .where(
+                table.time_ >= start,
+                table.time_ < end,
+            )
+            .order_by(table.time_)
+            .execution_options(yield_per=fetch_size)
+        )
+        if device_ids is not None:
+            stmt = stmt.where(table.device_id.in_(device_ids))
+        result = await self._db_session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
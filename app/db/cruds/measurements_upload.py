@@ -0,0 +1,128 @@
+from typing import Sequence
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String
+from sqlalchemy import FromClause, Select, Table, false, select, update
+from sqlalchemy.dialects.postgresql import insert, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models.devices import Devices as DevicesTable
+from db.models.devices import Measurements as MeasurementsTable
+from schemas.measurements import MEASUREMENT_CHANNELS
+
+UPLOAD_COLUMNS = ("id", "line", "device_uid", "time_", *MEASUREMENT_CHANNELS)
+
+# per transaction staging table of bulk uploads, kept out of the models
+# metadata so migrations never see it. Readings reference devices by uid,
+# devices are only resolved once the upload signature is verified.
+measurements_upload_table = Table(
+    "measurements_upload",
+    MetaData(),
+    Column("id", UUID(as_uuid=True), nullable=False),
+    Column("line", Integer, nullable=False),
+    Column("device_uid", String, nullable=False),
+    Column("time_", DateTime, nullable=False),
+    *[Column(channel, Float) for channel in MEASUREMENT_CHANNELS],
+    Column("inserted", Boolean, nullable=False, server_default=false()),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+class MeasurementsUploadCrud:
+    """
+    Bulk uploads are copied into a temporary staging table with COPY and
+    moved to measurements by a single INSERT ... SELECT, all in the session
+    transaction; the staging table is dropped when it ends
+    """
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self._db_session: AsyncSession = db_session
+
+    async def create_staging_table(self) -> None:
+        connection = await self._db_session.connection()
+        await connection.run_sync(measurements_upload_table.create)
+
+    async def copy_to_staging(self, records: Sequence[tuple]) -> None:
+        """
+        Copies records of UPLOAD_COLUMNS values with asyncpg COPY protocol
+        """
+        connection = await self._db_session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            measurements_upload_table.name,
+            records=records,
+            columns=UPLOAD_COLUMNS,
+        )
+
+    @staticmethod
+    def _with_device_ids(stmt_columns: Sequence[str]) -> Select:
+        """
+        Selects staged columns with device_uid resolved to the active device id
+        """
+        staging = measurements_upload_table
+        return select(
+            *[
+                (
+                    DevicesTable.id.label("device_id")
+                    if column == "device_id"
+                    else staging.c[column]
+                )
+                for column in stmt_columns
+            ]
+        ).join(
+            DevicesTable,
+            (DevicesTable.uid == staging.c.device_uid)
+            & DevicesTable.deleted_at.is_(None),
+        )
+
+    async def insert_from_staging(self) -> int:
+        """
+        Inserts staged rows of active devices skipping readings already stored
+        for the device and time, marks the inserted ones and returns their
+        number
+        """
+        staging = measurements_upload_table
+        measurements = MeasurementsTable.__table__
+        columns = ("id", "device_id", "time_", *MEASUREMENT_CHANNELS)
+        inserted = (
+            insert(measurements)
+            .from_select(
+                columns,
+                self._with_device_ids(columns).order_by(
+                    DevicesTable.id, staging.c.time_
+                ),
+            )
+            .on_conflict_do_nothing(
+                index_elements=[measurements.c.device_id, measurements.c.time_]
+            )
+            .returning(measurements.c.id)
+            .cte("inserted")
+        )
+        result = await self._db_session.execute(
+            update(staging).where(staging.c.id == inserted.c.id).values(inserted=True)
+        )
+        return result.rowcount
+
+    async def get_lines_of_devices(
+        self, device_uids: Sequence[str], limit: int
+    ) -> list[int]:
+        staging = measurements_upload_table
+        result = await self._db_session.execute(
+            select(staging.c.line)
+            .where(staging.c.device_uid.in_(device_uids))
+            .order_by(staging.c.line)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    def inserted_source(self) -> FromClause:
+        """
+        Staged rows stored by insert_from_staging with their device_id, to
+        update derived data from
+        """
+        staging = measurements_upload_table
+        return (
+            self._with_device_ids(("device_id", "time_", *MEASUREMENT_CHANNELS))
+            .where(staging.c.inserted)
+            .subquery("uploaded")
+        )
@@ -0,0 +1,235 @@
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Type
+from uuid import UUID
+
+from sqlalchemy import delete, func, literal, select, Interval, FromClause, Select
+from sqlalchemy.dialects.postgresql import insert, Insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.cruds.measurements import BUCKETS_ORIGIN, aggregate_entry_to_schema
+from db.models.devices import (
+    Measurements as MeasurementsTable,
+    MeasurementsDaily,
+    MeasurementsHourly,
+    MeasurementsRollupMixin,
+)
+from schemas.measurements import (
+    MeasurementAggregateSchema,
+    MeasurementBucketEnum,
+    MeasurementItemSchema,
+    MEASUREMENT_CHANNELS,
+)
+
+# (bucket size, date_trunc precision, table), coarsest first
+MEASUREMENT_ROLLUPS: tuple[
+    tuple[timedelta, str, Type[MeasurementsRollupMixin]], ...
+] = (
+    (timedelta(days=1), "day", MeasurementsDaily),
+    (timedelta(hours=1), "hour", MeasurementsHourly),
+)
+
+
+ROLLUP_COLUMNS = (
+    "device_id",
+    "bucket",
+    "count",
+    *[
+        f"{channel}_{stat}"
+        for channel in MEASUREMENT_CHANNELS
+        for stat in ("sum", "count", "min", "max")
+    ],
+)
+
+
+def truncate_time(value: datetime, precision: str) -> datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if precision == "day":
+        value = value.replace(hour=0)
+    return value
+
+
+class MeasurementRollupsCrud:
+    """
+    Hourly and daily per device measurement aggregates. Rollups are updated
+    in the same transaction as the measurements they include.
+    """
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self._db_session: AsyncSession = db_session
+
+    @staticmethod
+    def get_rollup(
+        bucket: MeasurementBucketEnum,
+    ) -> Optional[tuple[str, Type[MeasurementsRollupMixin]]]:
+        """
+        Coarsest rollup whose buckets fit into the requested bucket evenly
+        """
+        for interval, precision, table in MEASUREMENT_ROLLUPS:
+            if bucket.interval % interval == timedelta(0):
+                return precision, table
+        return None
+
+    async def apply(self, measurements: Sequence[MeasurementItemSchema]) -> None:
+        """
+        Adds measurements to the rollups with one upsert per rollup table.
+        Rollups only follow inserts: measurements updated or soft deleted
+        later (BaseCrud.update_by_id / delete_by_id) stay counted with their
+        old values until the day is recomputed by python -m db.rollups, so
+        1h/1d aggregates may differ from raw ones meanwhile
+        """
+        if not measurements:
+            return
+        for _, precision, table in MEASUREMENT_ROLLUPS:
+            aggregates: dict[tuple[UUID, datetime], dict] = {}
+            for measurement in measurements:
+                key = (
+                    measurement.device_id,
+                    truncate_time(measurement.time_, precision),
+                )
+                row = aggregates.get(key)
+                if row is None:
+                    row = aggregates[key] = {
+                        "device_id": key[0],
+                        "bucket": key[1],
+                        "count": 0,
+                        **{f"{channel}_count": 0 for channel in MEASUREMENT_CHANNELS},
+                        **{
+                            f"{channel}_{stat}": None
+                            for channel in MEASUREMENT_CHANNELS
+                            for stat in ("sum", "min", "max")
+                        },
+                    }
+                row["count"] += 1
+                for channel in MEASUREMENT_CHANNELS:
+                    value = getattr(measurement, channel)
+                    if value is None:
+                        continue
+                    if row[f"{channel}_count"] == 0:
+                        row[f"{channel}_sum"] = row[f"{channel}_min"] = value
+                        row[f"{channel}_max"] = value
+                    else:
+                        row[f"{channel}_sum"] += value
+                        row[f"{channel}_min"] = min(row[f"{channel}_min"], value)
+                        row[f"{channel}_max"] = max(row[f"{channel}_max"], value)
+                    row[f"{channel}_count"] += 1
+
+            # stable order keeps concurrent transactions from deadlocking
+            rows = [aggregates[key] for key in sorted(aggregates)]
+            await self._db_session.execute(
+                self._on_conflict_add(insert(table).values(rows), table)
+            )
+
+    async def apply_from(self, source: FromClause) -> None:
+        """
+        Adds measurements selected from source (device_id, time_ and channel
+        columns) to the rollups, aggregating them in the db
+        """
+        for _, precision, table in MEASUREMENT_ROLLUPS:
+            select_stmt = self._aggregate_select(source, precision)
+            # stable order keeps concurrent transactions from deadlocking
+            select_stmt = select_stmt.order_by(*select_stmt.selected_columns[:2])
+            await self._db_session.execute(
+                self._on_conflict_add(
+                    insert(table).from_select(ROLLUP_COLUMNS, select_stmt), table
+                )
+            )
+
+    @staticmethod
+    def _on_conflict_add(stmt: Insert, table: Type[MeasurementsRollupMixin]) -> Insert:
+        """
+        Merges inserted aggregates into the existing ones of the same bucket
+        """
+        columns = table.__table__.c
+        set_ = {"count": columns["count"] + stmt.excluded["count"]}
+        for channel in MEASUREMENT_CHANNELS:
+            sum_, count, min_, max_ = (
+                f"{channel}_{stat}" for stat in ("sum", "count", "min", "max")
+            )
+            set_[sum_] = func.coalesce(columns[sum_], 0) + func.coalesce(
+                stmt.excluded[sum_], 0
+            )
+            set_[count] = columns[count] + stmt.excluded[count]
+            set_[min_] = func.least(columns[min_], stmt.excluded[min_])
+            set_[max_] = func.greatest(columns[max_], stmt.excluded[max_])
+        return stmt.on_conflict_do_update(
+            index_elements=[table.device_id, table.bucket], set_=set_
+        )
+
+    @staticmethod
+    def _aggregate_select(source: FromClause, precision: str) -> Select:
+        """
+        Selects ROLLUP_COLUMNS of measurements in source
+        """
+        bucket_column = func.date_trunc(precision, source.c.time_)
+        channel_columns = []
+        for channel in MEASUREMENT_CHANNELS:
+            value = source.c[channel]
+            channel_columns += [
+                func.sum(value),
+                func.count(value),
+                func.min(value),
+                func.max(value),
+            ]
+        return select(
+            source.c.device_id, bucket_column, func.count(), *channel_columns
+        ).group_by(source.c.device_id, bucket_column)
+
+    async def backfill(self, start: datetime, end: datetime) -> None:
+        """
+        Recomputes rollups of [start, end) from raw measurements,
+        start and end must be aligned to days
+        """
+        for _, precision, table in MEASUREMENT_ROLLUPS:
+            await self._db_session.execute(
+                delete(table).where(table.bucket >= start, table.bucket < end)
+            )
+            measurements = MeasurementsTable.__table__
+            select_stmt = self._aggregate_select(measurements, precision).where(
+                measurements.c.deleted_at.is_(None),
+                measurements.c.time_ >= start,
+                measurements.c.time_ < end,
+            )
+            await self._db_session.execute(
+                insert(table).from_select(ROLLUP_COLUMNS, select_stmt)
+            )
+
+    async def get_aggregated_list(
+        self,
+        device_id: UUID,
+        start: datetime,
+        end: datetime,
+        bucket: MeasurementBucketEnum,
+    ) -> list[MeasurementAggregateSchema]:
+        """
+        Same as MeasurementsCrud.get_aggregated_list but read from the coarsest
+        fitting rollup; start and end must be aligned to bucket, see
+        align_to_buckets, as rollup rows are never split
+        """
+        _, table = self.get_rollup(bucket)
+        bucket_column = func.date_bin(
+            literal(bucket.interval, Interval), table.bucket, literal(BUCKETS_ORIGIN)
+        ).label("bucket")
+        channel_columns = []
+        for channel in MEASUREMENT_CHANNELS:
+            channel_columns += [
+                func.min(getattr(table, f"{channel}_min")).label(f"{channel}_min"),
+                (
+                    func.sum(getattr(table, f"{channel}_sum"))
+                    / func.nullif(func.sum(getattr(table, f"{channel}_count")), 0)
+                ).label(f"{channel}_avg"),
+                func.max(getattr(table, f"{channel}_max")).label(f"{channel}_max"),
+            ]
+        stmt = (
+            select(
+                bucket_column, func.sum(table.count).label("count"), *channel_columns
+            )
+            .where(
+                table.device_id == device_id,
+                table.bucket >= start,
+                table.bucket < end,
+            )
+            .group_by(bucket_column)
+            .order_by(bucket_column)
+        )
+        result = await self._db_session.execute(stmt)
+        return [aggregate_entry_to_schema(entry) for entry in result.all()]
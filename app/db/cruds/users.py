@@ -0,0 +1,101 @@
+from typing import Type
+
+from sqlalchemy import select
+from sqlalchemy.sql.elements import UnaryExpression
+from core.cache import LRUTTLCache
+from core.config import settings
+from db.cruds.base import BaseCrud
+from db.models.users import Users as UsersTable
+from schemas.auth_schemas import User
+from schemas.users import (
+    UserSchema,
+    PaginatedUserListSchema,
+    UserPartialUpdateSchema,
+    UserCreateSchema,
+)
+
+# identities of recently authenticated users by username
+users_cache: LRUTTLCache[str, User] = LRUTTLCache(
+    maxsize=settings.USERS_CACHE_MAX_SIZE, ttl=settings.USERS_CACHE_TTL_SECONDS
+)
+# session.info key of usernames of users changed by the session transaction
+EVICTED_USERNAMES_KEY = "evicted_usernames"
+
+
+class UsersCrud(
+    BaseCrud[
+        UserCreateSchema,  # in_schema
+        UserPartialUpdateSchema,
+        UserSchema,  # out_schema
+        PaginatedUserListSchema,
+        UserSchema,
+        UsersTable,
+    ]
+):
+    @property
+    def _table(self) -> Type[UsersTable]:
+        return UsersTable
+
+    @property
+    def _out_schema(self) -> Type[UserSchema]:
+        return UserSchema
+
+    @property
+    def default_ordering(self) -> UnaryExpression:
+        return UsersTable.created_at.desc()
+
+    @property
+    def _paginated_schema(self) -> Type[PaginatedUserListSchema]:
+        return PaginatedUserListSchema
+
+    @property
+    def _paginated_list_item_schema(self) -> Type[UserSchema]:
+        return UserSchema
+
+    async def update_by_id(
+        self,
+        entry_id,
+        in_data: UserPartialUpdateSchema,
+        active_only=True,
+        raise_404=True,
+        filter_statement=None,
+    ) -> None:
+        usernames = await self._get_usernames(entry_id)
+        await super().update_by_id(
+            entry_id, in_data, active_only, raise_404, filter_statement
+        )
+        if in_data.username is not None:
+            usernames.add(in_data.username)
+        self._evict_on_commit(usernames)
+
+    async def delete_by_id(
+        self, entry_id, permanently=False, raise_404=True, filter_statement=None
+    ) -> None:
+        usernames = await self._get_usernames(entry_id)
+        await super().delete_by_id(entry_id, permanently, raise_404, filter_statement)
+        self._evict_on_commit(usernames)
+
+    async def _get_usernames(self, entry_id) -> set[str]:
+        result = await self._db_session.execute(
+            select(self._table.username).where(self._table.id == entry_id)
+        )
+        return set(result.scalars())
+
+    def _evict_on_commit(self, usernames: set[str]) -> None:
+        """
+        Drops the cached identities now and again once the change is
+        committed: until then other sessions still read, and may cache, the
+        old row
+        """
+        for username in usernames:
+            users_cache.pop(username)
+        self._db_session.info.setdefault(EVICTED_USERNAMES_KEY, set()).update(usernames)
+
+    async def commit_session(self):
+        await super().commit_session()
+        for username in self._db_session.info.pop(EVICTED_USERNAMES_KEY, set()):
+            users_cache.pop(username)
+
+    async def rollback_session(self):
+        await super().rollback_session()
+        self._db_session.info.pop(EVICTED_USERNAMES_KEY, None)
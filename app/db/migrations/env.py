@@ -7,7 +7,14 @@ from alembic import context
 
 from db.models.base import Base  # noqa
 from db.models.users import Users  # noqa
-from db.models.devices import Devices, Measurements  # noqa
+from db.models.devices import (  # noqa
+    Devices,
+    Measurements,
+    MeasurementsCompact,
+    MeasurementsHourly,
+    MeasurementsDaily,
+    DevicesLatestMeasurements,
+)
 from core.config import settings
 
 config = context.config
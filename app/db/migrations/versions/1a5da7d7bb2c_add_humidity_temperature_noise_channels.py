@@ -0,0 +1,51 @@
+"""add humidity, temperature and noise channels
+
+Revision ID: 1a5da7d7bb2c
+Revises: 5be257450e8b
+Create Date: 2026-10-17 23:24:39.018446
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1a5da7d7bb2c"
+down_revision: Union[str, None] = "5be257450e8b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANNELS = ("humidity", "temperature", "noise")
+ROLLUP_TABLES = ("measurements_hourly", "measurements_daily")
+
+
+def upgrade() -> None:
+    for channel in CHANNELS:
+        # added to every partition as well
+        op.add_column("measurements", sa.Column(channel, sa.REAL(), nullable=True))
+        op.add_column(
+            "devices_latest_measurements",
+            sa.Column(channel, sa.Float(), nullable=True),
+        )
+        for table in ROLLUP_TABLES:
+            op.add_column(table, sa.Column(f"{channel}_sum", sa.Float(), nullable=True))
+            op.add_column(
+                table,
+                sa.Column(
+                    f"{channel}_count", sa.Integer(), server_default="0", nullable=False
+                ),
+            )
+            op.add_column(table, sa.Column(f"{channel}_min", sa.Float(), nullable=True))
+            op.add_column(table, sa.Column(f"{channel}_max", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    for channel in CHANNELS:
+        for table in ROLLUP_TABLES:
+            for stat in ("sum", "count", "min", "max"):
+                op.drop_column(table, f"{channel}_{stat}")
+        op.drop_column("devices_latest_measurements", channel)
+        op.drop_column("measurements", channel)
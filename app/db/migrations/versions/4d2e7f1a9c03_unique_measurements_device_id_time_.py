@@ -0,0 +1,47 @@
+"""make (device_id, time_) of measurements unique
+
+Existing duplicates are deleted first, keeping the active row with the lowest
+id. Rollups counted the deleted duplicates, rebuild them afterwards with
+python -m db.rollups.
+
+Revision ID: 4d2e7f1a9c03
+Revises: b9c34789f24e
+Create Date: 2026-10-18 00:12:41.903517
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4d2e7f1a9c03"
+down_revision: Union[str, None] = "b9c34789f24e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM measurements m USING measurements kept "
+        "WHERE m.device_id = kept.device_id AND m.time_ = kept.time_ "
+        "AND (m.deleted_at IS NOT NULL, m.id) > (kept.deleted_at IS NOT NULL, kept.id)"
+    )
+    # the unique index serves the same lookups as the plain one did
+    op.drop_index("ix_measurements_device_id_time_", table_name="measurements")
+    op.create_index(
+        "uq_measurements_device_id_time_",
+        "measurements",
+        ["device_id", "time_"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_measurements_device_id_time_", table_name="measurements")
+    op.create_index(
+        "ix_measurements_device_id_time_",
+        "measurements",
+        ["device_id", "time_"],
+    )
@@ -0,0 +1,48 @@
+"""add devices latest measurements table
+
+Revision ID: 5be257450e8b
+Revises: b8af5e1fcd9e
+Create Date: 2026-10-17 22:58:03.551270
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5be257450e8b"
+down_revision: Union[str, None] = "b8af5e1fcd9e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "devices_latest_measurements",
+        sa.Column("device_id", sa.UUID(), nullable=False),
+        sa.Column("time_", sa.DateTime(), nullable=False),
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True
+        ),
+        sa.Column("pm1", sa.Float(), nullable=True),
+        sa.Column("pm2_5", sa.Float(), nullable=True),
+        sa.Column("pm10", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("device_id"),
+    )
+    op.execute(
+        "INSERT INTO devices_latest_measurements (device_id, time_, pm1, pm2_5, pm10) "
+        "SELECT DISTINCT ON (device_id) device_id, time_, pm1, pm2_5, pm10 "
+        "FROM measurements WHERE deleted_at IS NULL "
+        "ORDER BY device_id, time_ DESC"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("devices_latest_measurements")
@@ -0,0 +1,148 @@
+"""partition measurements by month and add time series indexes
+
+Revision ID: 8c637fa5f137
+Revises: 6fd922e637c1
+Create Date: 2026-10-17 22:05:12.418305
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c637fa5f137"
+down_revision: Union[str, None] = "6fd922e637c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD_MONTHS = 3
+# older readings (usually from devices with broken clocks) go to the default partition
+PARTITIONS_BEHIND_MAX_MONTHS = 36
+
+MEASUREMENTS_COLUMNS = (
+    "id, created_at, modified_at, deleted_at, time_, pm1, pm2_5, pm10, device_id"
+)
+
+
+def _add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _measurements_columns(time_nullable: bool) -> list[sa.Column]:
+    return [
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True
+        ),
+        sa.Column("modified_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(), nullable=True),
+        sa.Column(
+            "time_",
+            sa.DateTime(),
+            server_default=None if time_nullable else sa.text("now()"),
+            nullable=time_nullable,
+        ),
+        sa.Column("pm1", sa.DECIMAL(), nullable=True),
+        sa.Column("pm2_5", sa.DECIMAL(), nullable=True),
+        sa.Column("pm10", sa.DECIMAL(), nullable=True),
+        sa.Column("device_id", sa.UUID(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    op.rename_table("measurements", "measurements_unpartitioned")
+    op.execute(
+        "ALTER TABLE measurements_unpartitioned "
+        "RENAME CONSTRAINT measurements_pkey TO measurements_unpartitioned_pkey"
+    )
+    op.execute(
+        "ALTER TABLE measurements_unpartitioned RENAME CONSTRAINT "
+        "measurements_device_id_fkey TO measurements_unpartitioned_device_id_fkey"
+    )
+
+    op.create_table(
+        "measurements",
+        *_measurements_columns(time_nullable=False),
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("id", "time_"),
+        postgresql_partition_by="RANGE (time_)",
+    )
+    op.execute("CREATE TABLE measurements_default PARTITION OF measurements DEFAULT")
+
+    first_time = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT min(coalesce(time_, created_at)) FROM measurements_unpartitioned"
+            )
+        )
+        .scalar()
+    )
+    current_month = date.today().replace(day=1)
+    month = max(
+        (first_time.date() if first_time else current_month).replace(day=1),
+        _add_months(current_month, -PARTITIONS_BEHIND_MAX_MONTHS),
+    )
+    while month <= _add_months(current_month, PARTITIONS_AHEAD_MONTHS):
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE measurements_y{month.year}m{month.month:02d} "
+            f"PARTITION OF measurements "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+
+    op.execute(
+        f"INSERT INTO measurements ({MEASUREMENTS_COLUMNS}) "
+        "SELECT id, created_at, modified_at, deleted_at, "
+        "coalesce(time_, created_at, now()), pm1, pm2_5, pm10, device_id "
+        "FROM measurements_unpartitioned"
+    )
+    op.drop_table("measurements_unpartitioned")
+
+    op.create_index(
+        "ix_measurements_device_id_time_",
+        "measurements",
+        ["device_id", "time_"],
+    )
+    op.create_index(
+        "ix_measurements_active_time_",
+        "measurements",
+        ["time_"],
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.create_table(
+        "measurements_unpartitioned",
+        *_measurements_columns(time_nullable=True),
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        f"INSERT INTO measurements_unpartitioned ({MEASUREMENTS_COLUMNS}) "
+        f"SELECT {MEASUREMENTS_COLUMNS} FROM measurements"
+    )
+    # drops all partitions and indexes as well
+    op.drop_table("measurements")
+    op.rename_table("measurements_unpartitioned", "measurements")
+    op.execute(
+        "ALTER TABLE measurements "
+        "RENAME CONSTRAINT measurements_unpartitioned_pkey TO measurements_pkey"
+    )
+    op.execute(
+        "ALTER TABLE measurements RENAME CONSTRAINT "
+        "measurements_unpartitioned_device_id_fkey TO measurements_device_id_fkey"
+    )
@@ -0,0 +1,53 @@
+"""add hourly and daily measurements rollup tables
+
+Revision ID: b8af5e1fcd9e
+Revises: 8c637fa5f137
+Create Date: 2026-10-17 22:31:47.902114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8af5e1fcd9e"
+down_revision: Union[str, None] = "8c637fa5f137"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = ("measurements_hourly", "measurements_daily")
+CHANNELS = ("pm1", "pm2_5", "pm10")
+
+
+def upgrade() -> None:
+    for table in ROLLUP_TABLES:
+        channel_columns = []
+        for channel in CHANNELS:
+            channel_columns += [
+                sa.Column(f"{channel}_sum", sa.Float(), nullable=True),
+                sa.Column(
+                    f"{channel}_count", sa.Integer(), server_default="0", nullable=False
+                ),
+                sa.Column(f"{channel}_min", sa.Float(), nullable=True),
+                sa.Column(f"{channel}_max", sa.Float(), nullable=True),
+            ]
+        op.create_table(
+            table,
+            sa.Column("device_id", sa.UUID(), nullable=False),
+            sa.Column("bucket", sa.DateTime(), nullable=False),
+            sa.Column("count", sa.Integer(), server_default="0", nullable=False),
+            *channel_columns,
+            sa.ForeignKeyConstraint(
+                ["device_id"],
+                ["devices.id"],
+            ),
+            sa.PrimaryKeyConstraint("device_id", "bucket"),
+        )
+
+
+def downgrade() -> None:
+    for table in ROLLUP_TABLES:
+        op.drop_table(table)
@@ -0,0 +1,90 @@
+"""add compact measurements table kept in sync by a trigger
+
+Revision ID: b9c34789f24e
+Revises: 1a5da7d7bb2c
+Create Date: 2026-10-17 23:47:15.620931
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9c34789f24e"
+down_revision: Union[str, None] = "1a5da7d7bb2c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANNELS = ("pm1", "pm2_5", "pm10", "humidity", "temperature", "noise")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "measurements_compact",
+        sa.Column("device_id", sa.UUID(), nullable=False),
+        sa.Column("time_", sa.DateTime(), nullable=False),
+        *[sa.Column(channel, sa.REAL(), nullable=True) for channel in CHANNELS],
+        sa.ForeignKeyConstraint(
+            ["device_id"],
+            ["devices.id"],
+        ),
+        sa.PrimaryKeyConstraint("device_id", "time_"),
+        postgresql_partition_by="RANGE (time_)",
+    )
+    op.execute(
+        "CREATE TABLE measurements_compact_default "
+        "PARTITION OF measurements_compact DEFAULT"
+    )
+    # same months as the existing measurements partitions
+    partitions = op.get_bind().execute(
+        sa.text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = 'measurements' "
+            "AND child.relname LIKE 'measurements\\_y%'"
+        )
+    )
+    for name, bound in partitions:
+        op.execute(
+            f"CREATE TABLE {name.replace('measurements_', 'measurements_compact_', 1)} "
+            f"PARTITION OF measurements_compact {bound}"
+        )
+
+    channels = ", ".join(CHANNELS)
+    new_channels = ", ".join(f"NEW.{channel}" for channel in CHANNELS)
+    op.execute(
+        f"""
+        CREATE FUNCTION measurements_compact_sync() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.deleted_at IS NULL THEN
+                    INSERT INTO measurements_compact (device_id, time_, {channels})
+                    VALUES (NEW.device_id, NEW.time_, {new_channels})
+                    ON CONFLICT (device_id, time_) DO NOTHING;
+                END IF;
+            ELSIF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
+                DELETE FROM measurements_compact
+                WHERE device_id = OLD.device_id AND time_ = OLD.time_;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER measurements_compact_sync "
+        "AFTER INSERT OR UPDATE OF deleted_at ON measurements "
+        "FOR EACH ROW EXECUTE FUNCTION measurements_compact_sync()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER measurements_compact_sync ON measurements")
+    op.execute("DROP FUNCTION measurements_compact_sync()")
+    op.drop_table("measurements_compact")
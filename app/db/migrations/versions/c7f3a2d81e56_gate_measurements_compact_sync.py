@@ -0,0 +1,91 @@
+"""mirror updates and deletes of measurements to the compact table and make
+the sync trigger optional
+
+The measurements_compact_sync trigger is dropped here; it is installed by
+python -m db.compact_measurements sync when MEASUREMENTS_COMPACT_SYNC is set.
+Compact rows may have diverged from measurements before (value updates, hard
+deletes, duplicates removed by 4d2e7f1a9c03), re-run the backfill before
+enabling MEASUREMENTS_COMPACT_READS.
+
+Revision ID: c7f3a2d81e56
+Revises: 4d2e7f1a9c03
+Create Date: 2026-10-18 09:31:07.215834
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7f3a2d81e56"
+down_revision: Union[str, None] = "4d2e7f1a9c03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANNELS = ("pm1", "pm2_5", "pm10", "humidity", "temperature", "noise")
+
+
+def upgrade() -> None:
+    channels = ", ".join(CHANNELS)
+    new_channels = ", ".join(f"NEW.{channel}" for channel in CHANNELS)
+    excluded_channels = ", ".join(
+        f"{channel} = EXCLUDED.{channel}" for channel in CHANNELS
+    )
+    op.execute("DROP TRIGGER measurements_compact_sync ON measurements")
+    # rows moved between partitions by db/partitions.py set
+    # measurements.compact_sync_paused for the move, their data is unchanged
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION measurements_compact_sync() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('measurements.compact_sync_paused', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM measurements_compact
+                WHERE device_id = OLD.device_id AND time_ = OLD.time_;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.deleted_at IS NULL THEN
+                INSERT INTO measurements_compact (device_id, time_, {channels})
+                VALUES (NEW.device_id, NEW.time_, {new_channels})
+                ON CONFLICT (device_id, time_) DO UPDATE SET {excluded_channels};
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    channels = ", ".join(CHANNELS)
+    new_channels = ", ".join(f"NEW.{channel}" for channel in CHANNELS)
+    op.execute("DROP TRIGGER IF EXISTS measurements_compact_sync ON measurements")
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION measurements_compact_sync() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.deleted_at IS NULL THEN
+                    INSERT INTO measurements_compact (device_id, time_, {channels})
+                    VALUES (NEW.device_id, NEW.time_, {new_channels})
+                    ON CONFLICT (device_id, time_) DO NOTHING;
+                END IF;
+            ELSIF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
+                DELETE FROM measurements_compact
+                WHERE device_id = OLD.device_id AND time_ = OLD.time_;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER measurements_compact_sync "
+        "AFTER INSERT OR UPDATE OF deleted_at ON measurements "
+        "FOR EACH ROW EXECUTE FUNCTION measurements_compact_sync()"
+    )
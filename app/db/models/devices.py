@@ -1,7 +1,8 @@
 from typing import Optional
 import uuid
 
-from sqlalchemy import Column, String, func, DateTime, DECIMAL, ForeignKey
+from sqlalchemy import Column, String, func, DateTime, DECIMAL, ForeignKey, Index, text
+from sqlalchemy import Integer, Float, REAL
 from sqlalchemy.orm import relationship, Mapped
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -25,17 +26,127 @@ class Devices(Base):
 
 class Measurements(Base):
     __tablename__ = "measurements"
+    __table_args__ = (
+        # a device reports at most one reading per timestamp, resends are dropped
+        Index("uq_measurements_device_id_time_", "device_id", "time_", unique=True),
+        Index(
+            "ix_measurements_active_time_",
+            "time_",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # monthly partitions are managed by db/partitions.py
+        {"postgresql_partition_by": "RANGE (time_)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     created_at = Column(DateTime, server_default=func.now())
     modified_at = Column(DateTime, server_onupdate=func.now())
     deleted_at = Column(DateTime)
 
-    time_ = Column(DateTime, nullable=True, server_default=None)
+    # part of the primary key since it is the partitioning key
+    time_ = Column(DateTime, primary_key=True, server_default=func.now())
 
     pm1 = Column(DECIMAL, nullable=True, server_default=None)
     pm2_5 = Column(DECIMAL, nullable=True, server_default=None)
     pm10 = Column(DECIMAL, nullable=True, server_default=None)
 
+    humidity = Column(REAL, nullable=True, server_default=None)
+    temperature = Column(REAL, nullable=True, server_default=None)
+    noise = Column(REAL, nullable=True, server_default=None)
+
     device_id = Column(UUID(as_uuid=True), ForeignKey("devices.id"), nullable=False)
     device: Mapped[Optional["Devices"]] = relationship()
+
+
+class MeasurementsCompact(Base):
+    """
+    Compact layout of measurements: natural (device_id, time_) key, fixed
+    width float4 values and no bookkeeping timestamps. Soft deleted rows are
+    removed. Kept in sync with measurements by a trigger when
+    MEASUREMENTS_COMPACT_SYNC is set, see db/compact_measurements.py.
+    """
+
+    __tablename__ = "measurements_compact"
+    __table_args__ = ({"postgresql_partition_by": "RANGE (time_)"},)
+
+    id = None
+    device_id = Column(UUID(as_uuid=True), ForeignKey("devices.id"), primary_key=True)
+    time_ = Column(DateTime, primary_key=True)
+
+    pm1 = Column(REAL, nullable=True)
+    pm2_5 = Column(REAL, nullable=True)
+    pm10 = Column(REAL, nullable=True)
+    humidity = Column(REAL, nullable=True)
+    temperature = Column(REAL, nullable=True)
+    noise = Column(REAL, nullable=True)
+
+
+class MeasurementsRollupMixin:
+    """
+    Per device aggregates of measurements over fixed time buckets, kept
+    incrementally: avg of a channel is its sum / count.
+    """
+
+    # natural (device_id, bucket) key instead of the uuid one
+    id = None
+    device_id = Column(UUID(as_uuid=True), ForeignKey("devices.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, server_default="0")
+
+    pm1_sum = Column(Float, nullable=True)
+    pm1_count = Column(Integer, nullable=False, server_default="0")
+    pm1_min = Column(Float, nullable=True)
+    pm1_max = Column(Float, nullable=True)
+
+    pm2_5_sum = Column(Float, nullable=True)
+    pm2_5_count = Column(Integer, nullable=False, server_default="0")
+    pm2_5_min = Column(Float, nullable=True)
+    pm2_5_max = Column(Float, nullable=True)
+
+    pm10_sum = Column(Float, nullable=True)
+    pm10_count = Column(Integer, nullable=False, server_default="0")
+    pm10_min = Column(Float, nullable=True)
+    pm10_max = Column(Float, nullable=True)
+
+    humidity_sum = Column(Float, nullable=True)
+    humidity_count = Column(Integer, nullable=False, server_default="0")
+    humidity_min = Column(Float, nullable=True)
+    humidity_max = Column(Float, nullable=True)
+
+    temperature_sum = Column(Float, nullable=True)
+    temperature_count = Column(Integer, nullable=False, server_default="0")
+    temperature_min = Column(Float, nullable=True)
+    temperature_max = Column(Float, nullable=True)
+
+    noise_sum = Column(Float, nullable=True)
+    noise_count = Column(Integer, nullable=False, server_default="0")
+    noise_min = Column(Float, nullable=True)
+    noise_max = Column(Float, nullable=True)
+
+
+class MeasurementsHourly(MeasurementsRollupMixin, Base):
+    __tablename__ = "measurements_hourly"
+
+
+class MeasurementsDaily(MeasurementsRollupMixin, Base):
+    __tablename__ = "measurements_daily"
+
+
+class DevicesLatestMeasurements(Base):
+    """
+    Newest measurement of every device, upserted on ingestion
+    """
+
+    __tablename__ = "devices_latest_measurements"
+
+    id = None
+    device_id = Column(UUID(as_uuid=True), ForeignKey("devices.id"), primary_key=True)
+    time_ = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    pm1 = Column(Float, nullable=True)
+    pm2_5 = Column(Float, nullable=True)
+    pm10 = Column(Float, nullable=True)
+    humidity = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+    noise = Column(Float, nullable=True)
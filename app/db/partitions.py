@@ -0,0 +1,162 @@
+"""
+Maintenance of monthly range partitions of time series tables:
+ - creates partitions for the upcoming months ahead of time;
+ - detaches (and optionally drops) partitions older than the retention period.
+
+Usage: python -m db.partitions [--ahead N] [--retention-months N] [--drop]
+"""
+
+import argparse
+import re
+from datetime import date
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import create_engine, Connection
+from sqlalchemy.sql import text
+
+from core.config import settings
+
+
+PARTITIONED_TABLES = ("measurements", "measurements_compact")
+
+PARTITION_NAME_RE = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def get_monthly_partitions(conn: Connection, table: str) -> dict[date, str]:
+    """
+    Returns attached monthly partitions of table mapped by their first day
+    """
+    result = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    )
+    partitions = {}
+    for (name,) in result:
+        match = PARTITION_NAME_RE.match(name)
+        if match and match["table"] == table:
+            partitions[date(int(match["year"]), int(match["month"]), 1)] = name
+    return partitions
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_partition(conn: Connection, table: str, month: date) -> str:
+    """
+    Creates the partition of month moving rows of that month out of the
+    default partition; Postgres refuses to create it while the default one
+    holds any. Runs in the transaction of conn.
+    """
+    name = partition_name(table, month)
+    default_name = default_partition_name(table)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    bound_spec = (
+        f"FOR VALUES FROM ('{month.isoformat()}') "
+        f"TO ('{add_months(month, 1).isoformat()}')"
+    )
+    has_default_rows = conn.execute(
+        text(
+            "SELECT to_regclass(:default_name) IS NOT NULL AND EXISTS ("
+            f"SELECT FROM {table} WHERE tableoid = to_regclass(:default_name) "
+            "AND time_ >= :start AND time_ < :end)"
+        ),
+        {"default_name": default_name, **bounds},
+    ).scalar()
+    if not has_default_rows:
+        conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bound_spec}")
+        )
+        return name
+
+    logger.info(f"Moving rows of {name} out of {default_name}")
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default_name}"))
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bound_spec}"))
+    # rows only change their partition, nothing to mirror to measurements_compact
+    conn.execute(text("SET LOCAL measurements.compact_sync_paused = 'on'"))
+    conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {default_name} "
+            "WHERE time_ >= :start AND time_ < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    conn.execute(text("SET LOCAL measurements.compact_sync_paused = 'off'"))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default_name} DEFAULT"))
+    return name
+
+
+def maintain_partitions(
+    conn: Connection,
+    table: str,
+    ahead_months: int,
+    retention_months: Optional[int] = None,
+    drop_expired: bool = False,
+    today: Optional[date] = None,
+) -> None:
+    current_month = (today or date.today()).replace(day=1)
+    partitions = get_monthly_partitions(conn, table)
+
+    for months in range(ahead_months + 1):
+        month = add_months(current_month, months)
+        if month not in partitions:
+            logger.info(f"Creating partition {create_partition(conn, table, month)}")
+
+    if retention_months is None:
+        return
+    oldest_kept_month = add_months(current_month, -retention_months)
+    for month, name in sorted(partitions.items()):
+        if month >= oldest_kept_month:
+            break
+        logger.info(f"Detaching expired partition {name}")
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if drop_expired:
+            logger.info(f"Dropping expired partition {name}")
+            conn.execute(text(f"DROP TABLE {name}"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--ahead", type=int, default=settings.MEASUREMENTS_PARTITIONS_AHEAD_MONTHS
+    )
+    parser.add_argument(
+        "--retention-months", type=int, default=settings.MEASUREMENTS_RETENTION_MONTHS
+    )
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        default=settings.MEASUREMENTS_DROP_EXPIRED_PARTITIONS,
+        help="drop expired partitions instead of only detaching them",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(url=settings.DATABASE_URL)
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            maintain_partitions(
+                conn, table, args.ahead, args.retention_months, args.drop
+            )
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
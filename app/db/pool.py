@@ -0,0 +1,74 @@
+import time
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, Pool
+from sqlalchemy import exc
+
+from core.metrics import (
+    db_pool_checked_out,
+    db_pool_overflow,
+    db_pool_size,
+    db_pool_timeouts_total,
+    db_pool_wait_seconds,
+)
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool which also measures how long checkouts wait for a connection
+    and exports its state as Prometheus gauges labeled by name
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # set to "replica" for the read replica engine by db/session.py
+        self.name = "primary"
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            db_pool_timeouts_total.labels(self.name).inc()
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - started) * 1000
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            db_pool_wait_seconds.labels(self.name).observe(wait_ms / 1000)
+            self._update_gauges()
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        db_pool_size.labels(self.name).set(self.size())
+        db_pool_checked_out.labels(self.name).set(self.checkedout())
+        db_pool_overflow.labels(self.name).set(self.overflow())
+
+    def recreate(self) -> Pool:
+        pool = super().recreate()
+        pool.name = self.name
+        return pool
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": (
+                self.total_wait_ms / self.checkouts if self.checkouts else 0
+            ),
+            "max_wait_ms": self.max_wait_ms,
+        }
@@ -0,0 +1,147 @@
+"""
+Opt-in SQL profiling hooked on engine cursor events: statements slower than
+DB_SLOW_QUERY_MS are logged with the shape of their parameters, and with
+DB_QUERY_PROFILING every request collects its statements, see
+QueryProfilerMiddleware.
+"""
+
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings, EnvironmentEnum
+
+
+class QueryProfile:
+    """
+    Statements executed while handling a request, aggregated by their text
+    so that repeated (N+1) queries stand out
+    """
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: dict[str, dict[str, int | float]] = {}
+
+    def add(self, statement: str, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        stats = self.statements.setdefault(
+            statement, {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["count"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+    def as_dict(self) -> dict[str, any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "statements": [
+                {"statement": statement, **stats}
+                for statement, stats in sorted(
+                    self.statements.items(), key=lambda i: -i[1]["total_ms"]
+                )
+            ],
+        }
+
+
+current_query_profile: ContextVar[Optional[QueryProfile]] = ContextVar(
+    "current_query_profile", default=None
+)
+recent_query_profiles: deque[QueryProfile] = deque(
+    maxlen=settings.DB_QUERY_PROFILES_KEPT
+)
+
+
+def parameters_shape(parameters) -> str:
+    """
+    Types of the bound parameters without their values
+    """
+    if isinstance(parameters, dict):
+        return str({key: type(value).__name__ for key, value in parameters.items()})
+    if isinstance(parameters, list) and parameters:
+        # executemany
+        return f"{len(parameters)} x {parameters_shape(parameters[0])}"
+    if isinstance(parameters, (list, tuple)):
+        return str([type(value).__name__ for value in parameters])
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, which a failed statement simply discards
+    context.query_profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_profiler_started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if (
+        settings.DB_SLOW_QUERY_MS is not None
+        and duration_ms >= settings.DB_SLOW_QUERY_MS
+    ):
+        logger.warning(
+            f"Slow query ({duration_ms:.1f} ms): {statement} "
+            f"parameters: {parameters_shape(parameters)}"
+        )
+    profile = current_query_profile.get()
+    if profile is not None:
+        profile.add(statement, duration_ms)
+
+
+def install_query_profiler(engine: Engine) -> None:
+    """
+    Listens to cursor events of the (sync) engine; nothing is installed when
+    neither profiling nor the slow query log is enabled
+    """
+    if not settings.DB_QUERY_PROFILING and settings.DB_SLOW_QUERY_MS is None:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryProfilerMiddleware:
+    """
+    Collects a QueryProfile of every request; in develop mode its query
+    count and time are returned in X-DB-Query-Count / X-DB-Query-Time-Ms
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.DB_QUERY_PROFILING:
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(scope["method"], scope["path"])
+        token = current_query_profile.set(profile)
+
+        async def send_wrapper(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and settings.ENVIRONMENT == EnvironmentEnum.DEVELOP
+            ):
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(profile.count)
+                headers["X-DB-Query-Time-Ms"] = f"{profile.total_ms:.1f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_profile.reset(token)
+            if profile.count:
+                recent_query_profiles.append(profile)
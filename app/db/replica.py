@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import text
+
+from core.config import settings
+from db.session import async_session, async_read_session, read_engine
+
+# 0 when everything received has been replayed, an idle primary would make
+# the time since the last replayed transaction look like lag otherwise
+REPLICATION_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class ReadReplicaState:
+    """
+    Health and replication lag of the read replica, checked at most every
+    check_interval seconds by the requests that need it
+    """
+
+    def __init__(self, check_interval: float, max_lag: float) -> None:
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.healthy = False
+        self.lag_seconds = None
+        self.checked_at = 0.0
+        self.fallbacks = 0
+        self._lock = asyncio.Lock()
+
+    async def _check(self) -> None:
+        try:
+            # an unreachable replica must not stall the requests waiting here
+            async with asyncio.timeout(self.check_interval):
+                async with read_engine.connect() as conn:
+                    result = await conn.execute(REPLICATION_LAG_QUERY)
+            self.lag_seconds = float(result.scalar())
+            self.healthy = self.lag_seconds <= self.max_lag
+            if not self.healthy:
+                logger.warning(f"Read replica lags by {self.lag_seconds:.1f}s")
+        except Exception as e:
+            logger.warning(f"Read replica is unavailable: {e}")
+            self.healthy = False
+            self.lag_seconds = None
+        self.checked_at = time.monotonic()
+
+    async def is_usable(self) -> bool:
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            async with self._lock:
+                # another request may have checked while this one waited
+                if time.monotonic() - self.checked_at >= self.check_interval:
+                    await self._check()
+        return self.healthy
+
+    def stats(self) -> dict[str, bool | float | int | None]:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "fallbacks": self.fallbacks,
+        }
+
+
+read_replica_state = ReadReplicaState(
+    check_interval=settings.READ_REPLICA_CHECK_INTERVAL_SECONDS,
+    max_lag=settings.READ_REPLICA_MAX_LAG_SECONDS,
+)
+
+
+async def get_read_session_maker() -> async_sessionmaker[AsyncSession]:
+    """
+    Session maker of the read replica, or of the primary when no replica is
+    configured or it is unhealthy or lagging beyond READ_REPLICA_MAX_LAG_SECONDS
+    """
+    if async_read_session is None:
+        return async_session
+    if await read_replica_state.is_usable():
+        return async_read_session
+    read_replica_state.fallbacks += 1
+    return async_session
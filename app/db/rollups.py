@@ -0,0 +1,61 @@
+"""
+Backfill of measurements rollup tables (hourly, daily) from raw measurements.
+Rollups of the given days are recomputed from scratch one day per transaction,
+so the command can be re-run safely.
+
+Usage: python -m db.rollups [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import func, select
+
+from db.cruds.rollups import MeasurementRollupsCrud
+from db.models.devices import Measurements
+from db.session import async_session, engine
+
+
+async def backfill(start: date | None, end: date | None) -> None:
+    if start is None:
+        async with async_session() as session:
+            first_time = (
+                await session.execute(select(func.min(Measurements.time_)))
+            ).scalar()
+        if first_time is None:
+            logger.info("No measurements to backfill")
+            return
+        start = first_time.date()
+    end = end or date.today() + timedelta(days=1)
+
+    day = start
+    while day < end:
+        day_start = datetime.combine(day, datetime.min.time())
+        async with async_session() as session:
+            await MeasurementRollupsCrud(session).backfill(
+                day_start, day_start + timedelta(days=1)
+            )
+            await session.commit()
+        logger.info(f"Rollups of {day.isoformat()} recomputed")
+        day += timedelta(days=1)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--start", type=date.fromisoformat, help="defaults to the first measurement"
+    )
+    parser.add_argument(
+        "--end", type=date.fromisoformat, help="exclusive, defaults to tomorrow"
+    )
+    args = parser.parse_args()
+    asyncio.run(backfill(args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
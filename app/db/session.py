@@ -1,10 +1,97 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
 
 from core.config import settings
+from core.metrics import db_sessions_total
+from db.pool import InstrumentedAsyncAdaptedQueuePool
+from db.profiling import install_query_profiler
+
+
+def get_engine_options() -> dict[str, any]:
+    connect_args = {
+        "timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT_SECONDS,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_PGBOUNCER_TRANSACTION_MODE:
+        # server connections change between transactions, so neither asyncpg
+        # nor sqlalchemy may reuse prepared statements or their names
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    options = {"echo": settings.DB_ECHO_LOG, "connect_args": connect_args}
+    if settings.DB_NULL_POOL:
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncAdaptedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+
+engine = create_async_engine(settings.async_database_url, **get_engine_options())
+install_query_profiler(engine.sync_engine)
+
+
+class TrackedSession(Session):
+    """
+    Sessions only check out a connection on their first statement, the
+    after_begin listener marks the ones which did
+    """
+
 
-engine = create_async_engine(
-    settings.async_database_url,
-    echo=settings.DB_ECHO_LOG,
+@event.listens_for(TrackedSession, "after_begin")
+def _mark_session_connected(session, transaction, connection) -> None:
+    session.info["connected"] = True
+
+
+async_session = async_sessionmaker(
+    engine, expire_on_commit=False, sync_session_class=TrackedSession
 )
 
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+read_engine = None
+async_read_session = None
+if settings.READ_DATABASE_URL:
+    read_engine = create_async_engine(
+        settings.async_read_database_url, **get_engine_options()
+    )
+    install_query_profiler(read_engine.sync_engine)
+    if isinstance(read_engine.pool, InstrumentedAsyncAdaptedQueuePool):
+        read_engine.pool.name = "replica"
+    async_read_session = async_sessionmaker(
+        read_engine, expire_on_commit=False, sync_session_class=TrackedSession
+    )
+
+session_counts = {"used": 0, "unused": 0}
+
+
+def record_session_usage(session: AsyncSession) -> None:
+    """
+    Counts sessions by whether they ever needed a db connection
+    """
+    used = "used" if session.info.get("connected") else "unused"
+    session_counts[used] += 1
+    db_sessions_total.labels(used).inc()
+
+
+def get_pool_stats() -> dict[str, int | float | str]:
+    pool = engine.pool
+    if isinstance(pool, InstrumentedAsyncAdaptedQueuePool):
+        stats = pool.stats()
+    else:
+        stats = {"status": pool.status()}
+    stats.update(
+        sessions_used=session_counts["used"], sessions_unused=session_counts["unused"]
+    )
+    return stats
@@ -7,4 +7,16 @@ python3 backend_pre_start.py
 
 alembic upgrade heads
 
+# Make sure partitions for the upcoming months exist
+python3 -m db.partitions
+
+# Mirror measurements to the compact table only when MEASUREMENTS_COMPACT_SYNC is set
+python3 -m db.compact_measurements sync
+
+# Metrics of previous worker processes must not be aggregated
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 exec "$@"
\ No newline at end of file
@@ -1,12 +1,18 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Response
 from fastapi.openapi.docs import get_redoc_html
+from fastapi.responses import ORJSONResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.cors import CORSMiddleware
 
 from core.config import settings
+from core.metrics import PrometheusMiddleware, render_metrics
+from db.profiling import QueryProfilerMiddleware
 from api.dependencies.docs_security import basic_http_credentials
 from api import v1
+from services.ingestion_buffer import measurements_buffer
 
 
 description = """
@@ -22,6 +28,14 @@ tags_metadata = [
 ]
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if settings.MEASUREMENTS_WRITE_BEHIND:
+        await measurements_buffer.start()
+    yield
+    await measurements_buffer.stop()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description=description,
@@ -34,12 +48,25 @@ app = FastAPI(
     redoc_url=None,
     openapi_url=None,
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+app.add_middleware(QueryProfilerMiddleware)
+app.add_middleware(PrometheusMiddleware)
+
 # include routes here
 app.include_router(v1.api_router)
 
 
+@app.get(
+    "/metrics", include_in_schema=False, dependencies=[Depends(basic_http_credentials)]
+)
+async def get_metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
 @app.get("/openapi.json", include_in_schema=False)
 async def openapi(_: str = Depends(basic_http_credentials)):
     schema = get_openapi(
@@ -19,4 +19,5 @@ class User(BaseModel):
     username: str
     email: str | None = None
     full_name: str | None = None
+    role: str | None = None
     disabled: bool | None = None
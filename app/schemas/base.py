@@ -1,3 +1,4 @@
+from enum import Enum
 from pydantic import BaseModel, ConfigDict
 from typing import Generic, TypeVar
 
@@ -9,6 +10,18 @@ class BaseSchema(BaseModel):
 BASE_SCHEMA = TypeVar("BASE_SCHEMA", bound=BaseSchema)
 
 
+class TotalCountModeEnum(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
 class BasePaginatedSchema(BaseSchema, Generic[BASE_SCHEMA]):
-    total: int
+    total: int | None
+    items: list[BASE_SCHEMA]
+
+
+class BaseCursorPaginatedSchema(BaseSchema, Generic[BASE_SCHEMA]):
+    total: int | None = None
+    next_cursor: str | None = None
     items: list[BASE_SCHEMA]
@@ -1,14 +1,26 @@
-from datetime import datetime
-from pydantic import BaseModel
+from datetime import datetime, timedelta
+from enum import Enum
+from pydantic import BaseModel, Field
 from uuid import UUID
 
-from schemas.base import BaseSchema, BasePaginatedSchema
+from core.config import settings
+
+from schemas.base import BaseSchema, BasePaginatedSchema, BaseCursorPaginatedSchema
+
+# value channels which are aggregated by the query api
+MEASUREMENT_CHANNELS = ("pm1", "pm2_5", "pm10", "humidity", "temperature", "noise")
 
 
 class MeasurementEncodedPayload(BaseModel):
     data: str
 
 
+class MeasurementBatchEncodedPayload(BaseModel):
+    data: list[str] = Field(
+        min_length=1, max_length=settings.MEASUREMENTS_BATCH_MAX_SIZE
+    )
+
+
 class MeasurementDecodedSchema(BaseSchema):
     device_id: str
     sensor_type: str | None = None
@@ -27,19 +39,135 @@ class MeasurementItemSchema(BaseSchema):
     pm1: float | None = None
     pm2_5: float | None = None
     pm10: float | None = None
+    humidity: float | None = None
+    temperature: float | None = None
+    noise: float | None = None
     time_: datetime | None = None
 
 
+class MeasurementIngestedSchema(MeasurementItemSchema):
+    # id of the already stored reading is not looked up for duplicates
+    id: UUID | None = None
+    duplicate: bool = False
+
+
 class PaginatedMeasurementListSchema(BasePaginatedSchema[MeasurementItemSchema]): ...
 
 
+class CursorPaginatedMeasurementListSchema(
+    BaseCursorPaginatedSchema[MeasurementItemSchema]
+): ...
+
+
 class MeasurementCreateSchema(BaseSchema):
     time_: datetime | None = None
     pm1: float | None = None
     pm2_5: float | None = None
     pm10: float | None = None
+    humidity: float | None = None
+    temperature: float | None = None
+    noise: float | None = None
     device_id: UUID
 
 
 class MeasurementPartialUpdateSchema(MeasurementCreateSchema):
     device_id: UUID | None = None
+
+
+class MeasurementBatchItemStatusEnum(str, Enum):
+    CREATED = "created"
+    # reading of the device at the same time is already stored
+    DUPLICATE = "duplicate"
+    REJECTED = "rejected"
+
+
+class MeasurementBatchItemResultSchema(BaseSchema):
+    index: int
+    status: MeasurementBatchItemStatusEnum
+    measurement: MeasurementIngestedSchema | None = None
+    detail: str | None = None
+
+
+class MeasurementBatchResultSchema(BaseSchema):
+    accepted: int
+    rejected: int
+    items: list[MeasurementBatchItemResultSchema]
+
+
+class MeasurementUploadFormatEnum(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class MeasurementUploadErrorSchema(BaseSchema):
+    line: int
+    detail: str
+
+
+class MeasurementUploadResultSchema(BaseSchema):
+    received: int
+    accepted: int
+    duplicates: int
+    rejected: int
+    # first MEASUREMENTS_UPLOAD_MAX_ERRORS rejected lines only
+    errors: list[MeasurementUploadErrorSchema]
+
+
+class MeasurementBucketEnum(str, Enum):
+    MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    HOUR = "1h"
+    DAY = "1d"
+
+    @property
+    def interval(self) -> timedelta:
+        return {
+            MeasurementBucketEnum.MINUTE: timedelta(minutes=1),
+            MeasurementBucketEnum.FIVE_MINUTES: timedelta(minutes=5),
+            MeasurementBucketEnum.HOUR: timedelta(hours=1),
+            MeasurementBucketEnum.DAY: timedelta(days=1),
+        }[self]
+
+
+class MeasurementChannelStatsSchema(BaseSchema):
+    min: float | None = None
+    avg: float | None = None
+    max: float | None = None
+
+
+class MeasurementAggregateSchema(BaseSchema):
+    bucket: datetime
+    count: int
+    pm1: MeasurementChannelStatsSchema
+    pm2_5: MeasurementChannelStatsSchema
+    pm10: MeasurementChannelStatsSchema
+    humidity: MeasurementChannelStatsSchema
+    temperature: MeasurementChannelStatsSchema
+    noise: MeasurementChannelStatsSchema
+
+
+class MeasurementAggregateListSchema(BaseSchema):
+    device_id: UUID
+    bucket: MeasurementBucketEnum
+    start: datetime
+    end: datetime
+    items: list[MeasurementAggregateSchema]
+
+
+class LatestMeasurementSchema(BaseSchema):
+    device_id: UUID
+    uid: str
+    name: str | None = None
+    lat: float | None = None
+    long: float | None = None
+    time_: datetime
+    pm1: float | None = None
+    pm2_5: float | None = None
+    pm10: float | None = None
+    humidity: float | None = None
+    temperature: float | None = None
+    noise: float | None = None
+
+
+class LatestMeasurementListSchema(BaseSchema):
+    items: list[LatestMeasurementSchema]
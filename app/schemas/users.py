@@ -0,0 +1,32 @@
+from uuid import UUID
+from datetime import datetime
+from typing import Optional
+
+from db.models.users import RoleChoices
+from schemas.base import BaseSchema, BasePaginatedSchema
+
+
+class UserSchema(BaseSchema):
+    id: UUID
+    created_at: datetime
+    modified_at: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+
+    username: str
+    email: str
+    role: RoleChoices
+
+
+class PaginatedUserListSchema(BasePaginatedSchema[UserSchema]): ...
+
+
+class UserCreateSchema(BaseSchema):
+    username: str
+    email: Optional[str] = None
+    password_hash: str
+    role: Optional[RoleChoices] = None
+
+
+class UserPartialUpdateSchema(UserCreateSchema):
+    username: Optional[str] = None
+    password_hash: Optional[str] = None
@@ -1,6 +1,21 @@
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, status as http_status
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from core.config import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
+
+# bcrypt runs in worker threads, at most this many at once per process
+password_hashing_limiter = anyio.CapacityLimiter(
+    settings.PASSWORD_HASHING_MAX_CONCURRENCY
+)
 
 
 def verify_password(plain_password, hashed_password):
@@ -9,3 +24,29 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+async def _run_hashing(func, *args):
+    """
+    Runs func off the event loop; raises 429 when too many calls are
+    already waiting for a hashing thread
+    """
+    waiting = password_hashing_limiter.statistics().tasks_waiting
+    if waiting >= settings.PASSWORD_HASHING_MAX_WAITING:
+        raise HTTPException(
+            status_code=http_status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent logins, retry later",
+        )
+    return await anyio.to_thread.run_sync(func, *args, limiter=password_hashing_limiter)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """
+    Verifies password and returns a new hash of it as well when the stored
+    one uses deprecated settings (scheme or rounds) and should be replaced
+    """
+    return await _run_hashing(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
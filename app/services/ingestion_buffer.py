@@ -0,0 +1,258 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from fastapi import HTTPException, status as http_status
+from loguru import logger
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+
+from core.config import settings
+from db.cruds.measurements import MeasurementsCrud
+from db.session import async_session
+from schemas.measurements import MeasurementCreateSchema, MeasurementIngestedSchema
+from services.measurements import (
+    remember_ingested_measurement,
+    store_measurements,
+    update_latest_snapshot,
+)
+
+QueueItem = tuple[MeasurementIngestedSchema, Optional[str]]
+
+# connection exceptions, transaction rollbacks (deadlocks, serialization
+# failures), lock timeouts, insufficient resources and operator intervention
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "55", "57")
+
+
+def is_transient_db_error(error: Exception) -> bool:
+    """
+    Tells failures of the db or the connection, after which the same rows
+    may be stored by a retry, from failures caused by the rows themselves
+    """
+    if isinstance(error, (OSError, asyncio.TimeoutError, PoolTimeoutError)):
+        return True
+    if isinstance(error, DBAPIError):
+        if error.connection_invalidated:
+            return True
+        sqlstate = getattr(error.orig, "sqlstate", None)
+        return sqlstate is not None and sqlstate[:2] in TRANSIENT_SQLSTATE_CLASSES
+    return False
+
+
+class MeasurementsWriteBehindBuffer:
+    """
+    Bounded in-memory queue of accepted measurements which are written to the
+    db in bulk by a background task every flush_interval_ms or as soon as
+    flush_max_rows are waiting, whichever comes first.
+
+    Accepted rows are answered before they are stored, so they are not
+    dropped on failure: batches failing on transient db errors are put back
+    in front of the queue and retried with exponential backoff, batches
+    failing on their data are bisected until the rows which can never be
+    stored are isolated, only these are rejected.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        flush_interval_ms: int,
+        flush_max_rows: int,
+        retry_backoff_ms: int,
+        retry_backoff_max_ms: int,
+        drain_timeout_seconds: float,
+    ) -> None:
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_rows = flush_max_rows
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.retry_backoff_max = retry_backoff_max_ms / 1000
+        self.drain_timeout = drain_timeout_seconds
+        # measurements with digests of their payloads
+        self._queue: deque[QueueItem] = deque()
+        # rows taken from the queue by the flush in progress, they keep their
+        # place in max_size so that a failed batch always fits back
+        self._in_flight = 0
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._retry_attempt = 0
+
+        self.rejected_rows = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.duplicate_rows = 0
+        self.retried_flushes = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue) + self._in_flight
+
+    def put(
+        self, in_schema: MeasurementCreateSchema, digest: Optional[str] = None
+    ) -> MeasurementIngestedSchema:
+        """
+        Enqueues measurement and returns it with its pre-generated id;
+        raises 429 when the queue, including rows waiting for a retry, is
+        full. Duplicate readings are only detected by the flush, which drops
+        them. The payload digest is remembered as ingested once the flush is
+        committed
+        """
+        if not self.running:
+            raise HTTPException(
+                status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ingestion queue is not running",
+            )
+        if self.queue_depth >= self.max_size:
+            self.rejected_rows += 1
+            raise HTTPException(
+                status_code=http_status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Ingestion queue is full, retry later",
+            )
+        item = MeasurementIngestedSchema(id=uuid.uuid4(), **in_schema.model_dump())
+        self._queue.append((item, digest))
+        if len(self._queue) >= self.flush_max_rows:
+            self._batch_ready.set()
+        return item
+
+    async def start(self) -> None:
+        self._queue = deque()
+        self._in_flight = 0
+        self._retry_attempt = 0
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Measurements write-behind buffer started")
+
+    async def stop(self) -> None:
+        """
+        Stops accepting new rows and flushes everything still queued, giving
+        up after drain_timeout when the db stays unavailable
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._batch_ready.set()
+        try:
+            await asyncio.wait_for(self._task, self.drain_timeout)
+        except asyncio.TimeoutError:
+            lost = self.queue_depth
+            self.failed_rows += lost
+            logger.error(
+                f"Measurements write-behind buffer stopped with {lost} rows "
+                f"not stored after {self.drain_timeout} s"
+            )
+        else:
+            logger.info("Measurements write-behind buffer drained and stopped")
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self._drain()
+        await self._drain()
+
+    async def _drain(self) -> None:
+        while self._queue:
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self.flush_max_rows, len(self._queue)))
+            ]
+            self._in_flight = len(batch)
+            stored = await self._store(batch)
+            self._in_flight = 0
+            if stored:
+                self._retry_attempt = 0
+                continue
+            delay = min(
+                self.retry_backoff * 2**self._retry_attempt, self.retry_backoff_max
+            )
+            self._retry_attempt += 1
+            self.retried_flushes += 1
+            await asyncio.sleep(delay)
+
+    async def _store(self, batch: list[QueueItem]) -> bool:
+        """
+        Flushes batch bisecting parts which fail on their data. On a
+        transient error the rows not stored yet are put back in front of the
+        queue and False is returned
+        """
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                await self._flush(part)
+            except Exception as e:
+                if is_transient_db_error(e):
+                    logger.warning(f"Measurements flush failed, will retry: {e!r}")
+                    remaining = part + [i for rest in reversed(parts) for i in rest]
+                    self._queue.extendleft(reversed(remaining))
+                    return False
+                if len(part) == 1:
+                    self.failed_rows += 1
+                    logger.exception(
+                        f"Measurement {part[0][0].id} cannot be stored, dropped: {e}"
+                    )
+                    continue
+                middle = len(part) // 2
+                parts += [part[middle:], part[:middle]]
+        return True
+
+    async def _flush(self, batch: list[QueueItem]) -> None:
+        started = time.perf_counter()
+        async with async_session() as session:
+            stored = await store_measurements(
+                session,
+                [MeasurementCreateSchema.model_validate(i) for i, _ in batch],
+                additional_data=[{"id": i.id} for i, _ in batch],
+            )
+            await MeasurementsCrud(session).commit_session()
+        update_latest_snapshot(stored)
+        for (_, digest), measurement in zip(batch, stored):
+            if digest is not None:
+                remember_ingested_measurement(digest, measurement)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.flushed_rows += len(batch)
+        self.duplicate_rows += sum(measurement.duplicate for measurement in stored)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    def stats(self) -> dict[str, int | float | bool]:
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "max_size": self.max_size,
+            "rejected_rows": self.rejected_rows,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "duplicate_rows": self.duplicate_rows,
+            "retried_flushes": self.retried_flushes,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0,
+        }
+
+
+measurements_buffer = MeasurementsWriteBehindBuffer(
+    max_size=settings.MEASUREMENTS_WRITE_BEHIND_QUEUE_SIZE,
+    flush_interval_ms=settings.MEASUREMENTS_WRITE_BEHIND_FLUSH_INTERVAL_MS,
+    flush_max_rows=settings.MEASUREMENTS_WRITE_BEHIND_FLUSH_MAX_ROWS,
+    retry_backoff_ms=settings.MEASUREMENTS_WRITE_BEHIND_RETRY_BACKOFF_MS,
+    retry_backoff_max_ms=settings.MEASUREMENTS_WRITE_BEHIND_RETRY_BACKOFF_MAX_MS,
+    drain_timeout_seconds=settings.MEASUREMENTS_WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS,
+)
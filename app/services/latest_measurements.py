@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import time
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db.cruds.latest_measurements import LatestMeasurementsCrud
+from schemas.measurements import (
+    LatestMeasurementListSchema,
+    LatestMeasurementSchema,
+    MeasurementItemSchema,
+    MEASUREMENT_CHANNELS,
+)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of etag with the comma separated If-None-Match list
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class LatestMeasurementsSnapshot:
+    """
+    In-process copy of devices_latest_measurements kept as ready to send JSON.
+    Updated by the readings this worker accepts and reloaded from the db
+    every ttl seconds to pick up readings accepted by other workers.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._items: dict[UUID, LatestMeasurementSchema] = {}
+        self._loaded_at: Optional[float] = None
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def update(self, measurements: Sequence[MeasurementItemSchema]) -> None:
+        for measurement in measurements:
+            item = self._items.get(measurement.device_id)
+            if item is None:
+                # device details are unknown here, take them from the db
+                self._loaded_at = None
+                continue
+            if measurement.time_ < item.time_:
+                continue
+            self._items[measurement.device_id] = item.model_copy(
+                update={
+                    "time_": measurement.time_,
+                    **{
+                        channel: getattr(measurement, channel)
+                        for channel in MEASUREMENT_CHANNELS
+                    },
+                }
+            )
+            self._body = None
+
+    def invalidate(self) -> None:
+        """
+        Makes the next get reload the snapshot from the db
+        """
+        self._loaded_at = None
+
+    async def get(self, db_session: AsyncSession) -> tuple[bytes, str]:
+        """
+        Returns serialized snapshot and its ETag
+        """
+        if self._stale:
+            async with self._lock:
+                if self._stale:
+                    items = await LatestMeasurementsCrud(db_session).get_list()
+                    self._items = {item.device_id: item for item in items}
+                    self._loaded_at = time.monotonic()
+                    self._body = None
+        if self._body is None:
+            self._body = (
+                LatestMeasurementListSchema(
+                    items=sorted(self._items.values(), key=lambda item: item.uid)
+                )
+                .model_dump_json()
+                .encode()
+            )
+            self._etag = f'"{hashlib.sha1(self._body).hexdigest()}"'
+        return self._body, self._etag
+
+
+latest_measurements_snapshot = LatestMeasurementsSnapshot(
+    ttl=settings.LATEST_MEASUREMENTS_SNAPSHOT_TTL_SECONDS
+)
@@ -0,0 +1,175 @@
+import hashlib
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, status as http_status
+from jose import jwt, JWTError
+from loguru import logger
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import LRUTTLCache
+from db.cruds.latest_measurements import LatestMeasurementsCrud
+from db.cruds.measurements import MeasurementsCrud
+from db.cruds.rollups import MeasurementRollupsCrud
+from schemas.devices import DeviceSchema
+from services.latest_measurements import latest_measurements_snapshot
+from schemas.measurements import (
+    MeasurementDecodedSchema,
+    MeasurementCreateSchema,
+    MeasurementItemSchema,
+    MeasurementIngestedSchema,
+)
+from core.config import settings
+
+# devices resend the very same signed payload on retries, both caches are
+# keyed by payload_digest
+# decoded payloads are kept with their exp claim, checked again on hits
+decoded_payloads_cache: LRUTTLCache[
+    str, tuple[Optional[float], MeasurementDecodedSchema]
+] = LRUTTLCache(
+    maxsize=settings.MEASUREMENT_PAYLOADS_CACHE_MAX_SIZE,
+    ttl=settings.MEASUREMENT_PAYLOADS_CACHE_TTL_SECONDS,
+)
+ingested_payloads_cache: LRUTTLCache[str, MeasurementIngestedSchema] = LRUTTLCache(
+    maxsize=settings.MEASUREMENT_PAYLOADS_CACHE_MAX_SIZE,
+    ttl=settings.MEASUREMENT_PAYLOADS_CACHE_TTL_SECONDS,
+)
+# dropped duplicate readings by device id
+duplicate_measurements: Counter[str] = Counter()
+
+
+def payload_digest(data_payload: str) -> str:
+    return hashlib.sha256(data_payload.encode()).hexdigest()
+
+
+def decode_measurement_payload(
+    data_payload: str, digest: Optional[str] = None
+) -> MeasurementDecodedSchema:
+    """
+    Decodes device signed JWT payload and validates it;
+    raises HTTPException if payload is broken
+    """
+    digest = digest or payload_digest(data_payload)
+    if (cached := decoded_payloads_cache.get(digest)) is not None:
+        expires_at, data = cached
+        if expires_at is None or expires_at > time.time():
+            return data
+        # decoding again raises the expired signature error
+        decoded_payloads_cache.pop(digest)
+    try:
+        claims = jwt.decode(
+            data_payload,
+            settings.DEVICE_DATA_SECRET_KEY,
+            algorithms=[settings.DEVICE_DATA_ALGORITHM],
+        )
+        data = MeasurementDecodedSchema.model_validate(claims)
+        decoded_payloads_cache.set(digest, (claims.get("exp"), data))
+        return data
+    except JWTError as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not decode JWT",
+        )
+    except ValidationError as e:
+        logger.exception(e)
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def get_ingested_measurement(digest: str) -> Optional[MeasurementIngestedSchema]:
+    """
+    Returns the measurement stored from the same payload recently, if any,
+    counting the payload as a dropped duplicate
+    """
+    measurement = ingested_payloads_cache.get(digest)
+    if measurement is None:
+        return None
+    count_duplicate_measurement(measurement)
+    return measurement.model_copy(update={"duplicate": True})
+
+
+def remember_ingested_measurement(
+    digest: str, measurement: MeasurementIngestedSchema
+) -> None:
+    ingested_payloads_cache.set(digest, measurement)
+
+
+def count_duplicate_measurement(measurement: MeasurementItemSchema) -> None:
+    duplicate_measurements[str(measurement.device_id)] += 1
+
+
+def to_float(value: float | str | None) -> float | None:
+    """
+    Some sensor firmwares send channels as strings, unparsable ones are dropped
+    """
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    Measurement times are stored as naive UTC timestamps
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_measurement_create_schema(
+    data: MeasurementDecodedSchema, device: DeviceSchema
+) -> MeasurementCreateSchema:
+    return MeasurementCreateSchema(
+        device_id=device.id,
+        time_=to_naive_utc(data.time) if data.time else datetime.utcnow(),
+        pm2_5=data.pm2_5,
+        pm10=data.pm10,
+        pm1=data.pm1,
+        humidity=data.humidity,
+        temperature=data.temperature,
+        noise=to_float(data.noise),
+    )
+
+
+async def store_measurements(
+    db_session: AsyncSession,
+    in_schemas: Sequence[MeasurementCreateSchema],
+    additional_data: Sequence[dict[str, any]] = None,
+) -> list[MeasurementIngestedSchema]:
+    """
+    Inserts measurements skipping readings already stored for the device and
+    time, and updates everything derived from the new ones in the db;
+    committing and then update_latest_snapshot are left to the caller
+    """
+    created = await MeasurementsCrud(db_session).create_many_skip_duplicates(
+        in_schemas, additional_data
+    )
+    measurements = [i for i in created if i is not None]
+    await MeasurementRollupsCrud(db_session).apply(measurements)
+    await LatestMeasurementsCrud(db_session).upsert(measurements)
+
+    results = []
+    for in_schema, measurement in zip(in_schemas, created):
+        if measurement is None:
+            measurement = MeasurementIngestedSchema(
+                **in_schema.model_dump(), duplicate=True
+            )
+            count_duplicate_measurement(measurement)
+        else:
+            measurement = MeasurementIngestedSchema(**measurement.model_dump())
+        results.append(measurement)
+    return results
+
+
+def update_latest_snapshot(measurements: Sequence[MeasurementIngestedSchema]) -> None:
+    """
+    Feeds readings stored by store_measurements to the in-process latest
+    measurements snapshot, only once they are committed
+    """
+    latest_measurements_snapshot.update(
+        [measurement for measurement in measurements if not measurement.duplicate]
+    )
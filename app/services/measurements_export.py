@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row
+
+from db.cruds.measurements import MeasurementsCrud
+from db.replica import get_read_session_maker
+from schemas.measurements import MEASUREMENT_CHANNELS
+
+EXPORT_COLUMNS = ("device_uid", "time_", *MEASUREMENT_CHANNELS)
+
+
+class MeasurementExportFormatEnum(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+    @property
+    def media_type(self) -> str:
+        return {
+            MeasurementExportFormatEnum.CSV: "text/csv",
+            MeasurementExportFormatEnum.NDJSON: "application/x-ndjson",
+            MeasurementExportFormatEnum.ARROW: "application/vnd.apache.arrow.stream",
+            MeasurementExportFormatEnum.PARQUET: "application/vnd.apache.parquet",
+        }[self]
+
+
+class _CsvWriter:
+    def __init__(self) -> None:
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def _pop(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def write(self, rows: Sequence[Row]) -> bytes:
+        self._writer.writerows(rows)
+        return self._pop()
+
+    def close(self) -> bytes:
+        return self._pop()
+
+
+class _NdjsonWriter:
+    def write(self, rows: Sequence[Row]) -> bytes:
+        return "".join(
+            json.dumps(
+                {
+                    column: value.isoformat() if isinstance(value, datetime) else value
+                    for column, value in zip(EXPORT_COLUMNS, row)
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+            for row in rows
+        ).encode()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file collecting what arrow writers emit until it is popped
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _ArrowWriter:
+    """
+    Arrow IPC stream or Parquet file, a record batch / row group per chunk
+    """
+
+    def __init__(self, parquet: bool) -> None:
+        # heavy import, only paid by workers which actually export columnar data
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("device_uid", pa.string()),
+                ("time_", pa.timestamp("us")),
+                *[(channel, pa.float32()) for channel in MEASUREMENT_CHANNELS],
+            ]
+        )
+        self._sink = _ChunkSink()
+        if parquet:
+            self._writer = pq.ParquetWriter(self._sink, self._schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def write(self, rows: Sequence[Row]) -> bytes:
+        self._writer.write_table(
+            self._pa.Table.from_pylist(
+                [row._asdict() for row in rows], schema=self._schema
+            )
+        )
+        return self._sink.pop()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.pop()
+
+
+async def iter_measurements_export(
+    export_format: MeasurementExportFormatEnum,
+    start: datetime,
+    end: datetime,
+    device_ids: Optional[Sequence[UUID]],
+    fetch_size: int,
+) -> AsyncIterator[bytes]:
+    """
+    Yields encoded export chunk by chunk; holds at most fetch_size rows in
+    memory. Uses its own session (of the read replica when usable) since it
+    outlives the request dependencies.
+    """
+    match export_format:
+        case MeasurementExportFormatEnum.CSV:
+            writer = _CsvWriter()
+        case MeasurementExportFormatEnum.NDJSON:
+            writer = _NdjsonWriter()
+        case _:
+            writer = _ArrowWriter(
+                parquet=export_format == MeasurementExportFormatEnum.PARQUET
+            )
+
+    session_maker = await get_read_session_maker()
+    async with session_maker() as session:
+        async for rows in MeasurementsCrud(session).stream_export(
+            start, end, device_ids, fetch_size
+        ):
+            if chunk := writer.write(rows):
+                yield chunk
+    if chunk := writer.close():
+        yield chunk
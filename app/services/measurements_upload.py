@@ -0,0 +1,315 @@
+import csv
+import hashlib
+import hmac
+import json
+import zlib
+from collections import Counter
+from typing import AsyncIterator, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException, status as http_status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db.cruds.devices import DevicesCrud
+from db.cruds.latest_measurements import LatestMeasurementsCrud
+from db.cruds.measurements import MeasurementsCrud
+from db.cruds.measurements_upload import MeasurementsUploadCrud
+from db.cruds.rollups import MeasurementRollupsCrud
+from schemas.devices import DeviceCreateSchema
+from schemas.measurements import (
+    MeasurementDecodedSchema,
+    MeasurementUploadErrorSchema,
+    MeasurementUploadFormatEnum,
+    MeasurementUploadResultSchema,
+    MEASUREMENT_CHANNELS,
+)
+from services.latest_measurements import latest_measurements_snapshot
+from services.measurements import to_float, to_naive_utc
+
+# gzip bodies are inflated at most this many bytes at a time
+GUNZIP_CHUNK_SIZE = 256 * 1024
+# devices of an upload are registered with statements of this many uids
+DEVICES_RESOLVE_CHUNK_SIZE = 1000
+
+
+def sign_upload(body: bytes) -> str:
+    """
+    Signature of an upload body expected in the X-Signature header
+    """
+    return hmac.new(
+        settings.DEVICE_DATA_SECRET_KEY.encode(), body, hashlib.sha256
+    ).hexdigest()
+
+
+async def _gunzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        async for chunk in chunks:
+            while chunk:
+                yield decompressor.decompress(chunk, GUNZIP_CHUNK_SIZE)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+    except zlib.error as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=f"Broken gzip body: {e}",
+        )
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[list[bytes]]:
+    """
+    Splits the body into lines, yields the complete lines of every chunk
+    """
+    max_line_bytes = settings.MEASUREMENTS_UPLOAD_MAX_LINE_BYTES
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_line_bytes or any(
+            len(line) > max_line_bytes for line in lines
+        ):
+            raise HTTPException(
+                status_code=http_status.HTTP_400_BAD_REQUEST,
+                detail=f"Lines are limited to {max_line_bytes} bytes",
+            )
+        if lines:
+            yield lines
+    if pending:
+        yield [pending]
+
+
+class _MeasurementsUpload:
+    """
+    Parses upload lines into staging records batch by batch
+    """
+
+    def __init__(
+        self, db_session: AsyncSession, upload_format: MeasurementUploadFormatEnum
+    ) -> None:
+        self.upload_format = upload_format
+        self.devices_crud = DevicesCrud(db_session)
+        self.upload_crud = MeasurementsUploadCrud(db_session)
+        # staged readings and first reported sensor type by device uid
+        self.device_rows: Counter[str] = Counter()
+        self.sensor_types: dict[str, Optional[str]] = {}
+        self.csv_header: Optional[list[str]] = None
+        self.line_number = 0
+        self.received = 0
+        self.rejected = 0
+        self.errors: list[MeasurementUploadErrorSchema] = []
+
+    def reject(self, line_number: int, detail: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < settings.MEASUREMENTS_UPLOAD_MAX_ERRORS:
+            self.errors.append(
+                MeasurementUploadErrorSchema(line=line_number, detail=detail)
+            )
+
+    def _decode(self, lines: list[bytes]) -> list[tuple[int, Optional[str]]]:
+        decoded = []
+        for line in lines:
+            self.line_number += 1
+            try:
+                decoded.append((self.line_number, line.decode().rstrip("\r")))
+            except UnicodeDecodeError:
+                decoded.append((self.line_number, None))
+        return decoded
+
+    def _parse_ndjson(self, lines: list[bytes]) -> list[tuple[int, dict | str]]:
+        entries = []
+        for line_number, line in self._decode(lines):
+            if line is None:
+                entries.append((line_number, "Invalid UTF-8"))
+                continue
+            if not line.strip():
+                continue
+            try:
+                entries.append((line_number, json.loads(line)))
+            except ValueError as e:
+                entries.append((line_number, f"Invalid JSON: {e}"))
+        return entries
+
+    def _parse_csv(self, lines: list[bytes]) -> list[tuple[int, dict | str]]:
+        entries = []
+        decoded = []
+        for line_number, line in self._decode(lines):
+            if line is None:
+                entries.append((line_number, "Invalid UTF-8"))
+            elif line:
+                decoded.append((line_number, line))
+        # quoted values spanning lines are not supported, a row per line
+        rows = csv.reader(line for _, line in decoded)
+        for (line_number, _), row in zip(decoded, rows):
+            if self.csv_header is None:
+                self.csv_header = row
+                continue
+            if len(row) != len(self.csv_header):
+                entries.append(
+                    (line_number, f"Expected {len(self.csv_header)} columns")
+                )
+                continue
+            # empty cells are missing values
+            entries.append(
+                (line_number, {k: v for k, v in zip(self.csv_header, row) if v})
+            )
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def _validate(
+        self, entries: list[tuple[int, dict | str]]
+    ) -> list[tuple[int, MeasurementDecodedSchema]]:
+        measurements = []
+        for line_number, entry in entries:
+            self.received += 1
+            if isinstance(entry, str):
+                self.reject(line_number, entry)
+                continue
+            try:
+                data = MeasurementDecodedSchema.model_validate(entry)
+            except ValidationError as e:
+                self.reject(line_number, str(e))
+                continue
+            if data.time is None:
+                self.reject(line_number, "time is required")
+                continue
+            measurements.append((line_number, data))
+        return measurements
+
+    async def load(self, lines: list[bytes]) -> None:
+        """
+        Validates lines and copies the valid measurements to staging
+        """
+        if self.upload_format == MeasurementUploadFormatEnum.CSV:
+            entries = self._parse_csv(lines)
+        else:
+            entries = self._parse_ndjson(lines)
+        records = []
+        for line_number, data in self._validate(entries):
+            self.device_rows[data.device_id] += 1
+            self.sensor_types.setdefault(data.device_id, data.sensor_type)
+            records.append(
+                (
+                    uuid4(),
+                    line_number,
+                    data.device_id,
+                    to_naive_utc(data.time),
+                    *[
+                        to_float(getattr(data, channel))
+                        for channel in MEASUREMENT_CHANNELS
+                    ],
+                )
+            )
+        if records:
+            await self.upload_crud.copy_to_staging(records)
+
+    async def resolve_devices(self) -> None:
+        """
+        Registers unknown devices of the staged readings; readings of deleted
+        devices are rejected
+        """
+        uids = sorted(self.device_rows)
+        deleted = []
+        for start in range(0, len(uids), DEVICES_RESOLVE_CHUNK_SIZE):
+            chunk = uids[start : start + DEVICES_RESOLVE_CHUNK_SIZE]
+            devices = await self.devices_crud.get_or_create_many_by_uids(
+                [
+                    DeviceCreateSchema(uid=uid, sensor_type=self.sensor_types[uid])
+                    for uid in chunk
+                ],
+                use_cache=True,
+            )
+            deleted += [uid for uid in chunk if uid not in devices]
+        if not deleted:
+            return
+        self.rejected += sum(self.device_rows[uid] for uid in deleted)
+        limit = settings.MEASUREMENTS_UPLOAD_MAX_ERRORS - len(self.errors)
+        if limit > 0:
+            lines = await self.upload_crud.get_lines_of_devices(deleted, limit)
+            self.errors += [
+                MeasurementUploadErrorSchema(line=line, detail="Device is deleted")
+                for line in lines
+            ]
+            self.errors.sort(key=lambda error: error.line)
+
+
+async def upload_measurements(
+    db_session: AsyncSession,
+    body: AsyncIterator[bytes],
+    upload_format: MeasurementUploadFormatEnum,
+    signature: str,
+    gzipped: bool = False,
+) -> MeasurementUploadResultSchema:
+    """
+    Stream-loads an NDJSON or CSV upload of MeasurementDecodedSchema records
+    signed with DEVICE_DATA_SECRET_KEY, see sign_upload. Nothing is stored
+    unless the signature of the whole body matches. The signature is only
+    known at the end, so bodies over MEASUREMENTS_UPLOAD_MAX_BYTES as sent
+    or MEASUREMENTS_UPLOAD_MAX_LINES lines are refused with 413 on the way.
+    """
+    signer = hmac.new(settings.DEVICE_DATA_SECRET_KEY.encode(), None, hashlib.sha256)
+
+    async def signed_body() -> AsyncIterator[bytes]:
+        size = 0
+        async for chunk in body:
+            size += len(chunk)
+            if size > settings.MEASUREMENTS_UPLOAD_MAX_BYTES:
+                raise HTTPException(
+                    status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Uploads are limited to "
+                    f"{settings.MEASUREMENTS_UPLOAD_MAX_BYTES} bytes",
+                )
+            signer.update(chunk)
+            yield chunk
+
+    chunks = _gunzip(signed_body()) if gzipped else signed_body()
+    upload = _MeasurementsUpload(db_session, upload_format)
+    await upload.upload_crud.create_staging_table()
+
+    batch: list[bytes] = []
+    line_count = 0
+    async for lines in _iter_lines(chunks):
+        # gzip bodies may inflate far beyond their size as sent
+        line_count += len(lines)
+        if line_count > settings.MEASUREMENTS_UPLOAD_MAX_LINES:
+            raise HTTPException(
+                status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Uploads are limited to "
+                f"{settings.MEASUREMENTS_UPLOAD_MAX_LINES} lines",
+            )
+        batch += lines
+        if len(batch) >= settings.MEASUREMENTS_UPLOAD_BATCH_SIZE:
+            await upload.load(batch)
+            batch = []
+    await upload.load(batch)
+
+    measurements_crud = MeasurementsCrud(db_session)
+    # bytes, compare_digest raises TypeError for non-ASCII str
+    if not hmac.compare_digest(
+        signer.hexdigest().encode(), signature.lower().encode("latin-1")
+    ):
+        await measurements_crud.rollback_session()
+        raise HTTPException(
+            status_code=http_status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid upload signature",
+        )
+
+    # devices are registered, and their rows locked, only for signed uploads
+    await upload.resolve_devices()
+    accepted = await upload.upload_crud.insert_from_staging()
+    if accepted:
+        uploaded = upload.upload_crud.inserted_source()
+        await MeasurementRollupsCrud(db_session).apply_from(uploaded)
+        await LatestMeasurementsCrud(db_session).upsert_from(uploaded)
+    await measurements_crud.commit_session()
+    if accepted:
+        latest_measurements_snapshot.invalidate()
+
+    return MeasurementUploadResultSchema(
+        received=upload.received,
+        accepted=accepted,
+        duplicates=upload.received - upload.rejected - accepted,
+        rejected=upload.rejected,
+        errors=upload.errors,
+    )
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException
 from jose import JWTError, jwt
@@ -11,8 +11,10 @@ from starlette import status
 from api.dependencies.auth_handler import oauth2_scheme
 from api.dependencies.database import DbSessionDep
 from schemas.auth_schemas import TokenData, User
+from schemas.users import UserPartialUpdateSchema
+from db.cruds.users import UsersCrud, users_cache
 from db.models import Users
-from services.hash_password import verify_password
+from services.hash_password import verify_and_update_password
 from core.config import settings
 
 
@@ -34,8 +36,21 @@ async def authenticate_user(
     user = await get_user(db_session, username)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    verified, new_password_hash = await verify_and_update_password(
+        password, user.password_hash
+    )
+    if not verified:
         return False
+    if new_password_hash is not None:
+        # stored hash uses deprecated settings, replace it while the
+        # plain password is at hand
+        users_crud = UsersCrud(db_session)
+        await users_crud.update_by_id(
+            user.id,
+            UserPartialUpdateSchema(password_hash=new_password_hash),
+            active_only=False,
+        )
+        await users_crud.commit_session()
     return user
 
 
@@ -49,13 +64,53 @@ async def get_user(db_session: AsyncSession, username: str) -> Users | None:
     return user
 
 
+def to_user_schema(user: Users) -> User:
+    return User(
+        username=user.username,
+        email=user.email,
+        role=user.role.name if user.role else None,
+        disabled=user.deleted_at is not None,
+    )
+
+
+def invalidate_cached_user(username: str) -> None:
+    """
+    Drops the cached identity so that it is read again; UsersCrud evicts
+    users it updates or disables by itself
+    """
+    users_cache.pop(username)
+
+
+async def get_user_identity(db_session: AsyncSession, username: str) -> Optional[User]:
+    """
+    Get user by username, served from users_cache for a short time
+    """
+    if (user := users_cache.get(username)) is not None:
+        return user
+    user = await get_user(db_session, username)
+    if user is None:
+        return None
+    user = to_user_schema(user)
+    users_cache.set(username, user)
+    return user
+
+
+def get_identity_claims(user: User) -> dict:
+    """
+    Claims get_current_user trusts with AUTH_TRUST_TOKEN_CLAIMS instead of
+    reading the user
+    """
+    return {"sub": user.username, "role": user.role, "active": not user.disabled}
+
+
 def create_access_token(data: dict) -> (str, str):
     """
     Creates access and refresh token JWTs and returns them
     """
 
     to_encode_access_token = data.copy()
-    to_encode_refresh_token = data.copy()
+    # only "sub" is needed to refresh, identity claims are re-read then
+    to_encode_refresh_token = {"sub": data["sub"]}
 
     access_token_expire = datetime.utcnow() + timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
@@ -80,7 +135,12 @@ def create_access_token(data: dict) -> (str, str):
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db_session: DbSessionDep,
-) -> Users:
+) -> User:
+    """
+    With AUTH_TRUST_TOKEN_CLAIMS the user is built from the token claims,
+    otherwise it is looked up through users_cache. The db session only
+    connects on a cache miss.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -89,7 +149,13 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = await get_user(db_session, username=token_data.username)
+    if settings.AUTH_TRUST_TOKEN_CLAIMS and "active" in payload:
+        return User(
+            username=token_data.username,
+            role=payload.get("role"),
+            disabled=not payload["active"],
+        )
+    user = await get_user_identity(db_session, username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -103,7 +169,12 @@ async def get_current_active_user(
     return current_user
 
 
-def refresh_access_token(refresh_token: str | None = None) -> (str, str):
+async def refresh_access_token(
+    db_session: AsyncSession, refresh_token: str | None = None
+) -> (str, str):
+    """
+    Issues new tokens with identity claims of the current state of the user
+    """
     if not refresh_token:
         raise HTTPException(status_code=400, detail="Refresh token is not provided")
     try:
@@ -111,10 +182,13 @@ def refresh_access_token(refresh_token: str | None = None) -> (str, str):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        access_token, refresh_token = create_access_token({"sub": username})
-        return access_token, refresh_token
     except JWTError:
         raise credentials_exception
+    invalidate_cached_user(username)
+    user = await get_user_identity(db_session, username)
+    if user is None or user.disabled:
+        raise credentials_exception
+    return create_access_token(get_identity_claims(user))
 
 
 def verify_token(token: Annotated[str, Depends(oauth2_scheme)]) -> str: